@@ -0,0 +1,246 @@
+"""End to end gateway dispatch benchmarks.
+
+Every event goes through the same path a live connection uses:
+WebsocketProtocol.data_received -> create_frames -> DiscordResponse.unmarshal
+-> EventPusher.push_event -> gateway handler -> state _add -> client listener.
+
+Run from the repository root:
+
+    python -m benchmarks.dispatch [--output results.json] [--scale 0.1] [name ...]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+
+import snakecord
+from snakecord.connection import Shard, ShardOpcode, WebsocketFrame, WebsocketProtocol
+from snakecord.testing import payloads
+
+READ_SIZE = 64 * 1024
+
+
+def encode(sequence, name, data):
+    payload = {'op': ShardOpcode.DISPATCH, 's': sequence, 't': name, 'd': data}
+    return bytes(WebsocketFrame.create_frame(json.dumps(payload).encode(), masked=False))
+
+
+class Harness:
+    def __init__(self, loop):
+        self.loop = loop
+        self.client = snakecord.Client(loop=loop)
+        self.shard = Shard('ws://127.0.0.1/', self.client.sharder, 0)
+        self.protocol = WebsocketProtocol(self.shard)
+        self.protocol.have_headers.set()
+        self.shard.protocol = self.protocol
+        self.sequence = 0
+
+        self.received = 0
+        self.target = None
+        self.done = None
+        self.listening = set()
+
+    def frame(self, name, data):
+        self.sequence += 1
+        return encode(self.sequence, name, data)
+
+    def listen(self, name):
+        if name not in self.listening:
+            self.client.register_listener(name, self._on_event)
+            self.listening.add(name)
+
+    def _on_event(self, *args):
+        self.received += 1
+        if self.received == self.target:
+            self.done.set_result(None)
+
+    async def feed(self, frames, *, read_size=READ_SIZE):
+        # Frames arrive packed into socket sized reads, like they would
+        # from the transport.
+        self.received = 0
+        self.target = len(frames)
+        self.done = self.loop.create_future()
+
+        stream = b''.join(frames)
+        for offset in range(0, len(stream), read_size):
+            self.protocol.data_received(stream[offset:offset + read_size])
+
+        await self.done
+
+    async def feed_one(self, frame):
+        self.received = 0
+        self.target = 1
+        self.done = self.loop.create_future()
+
+        self.protocol.data_received(frame)
+        await self.done
+
+    async def close(self):
+        await self.client.rest.client_session.close()
+
+
+def summarize(name, events, seconds, latencies, **extra):
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1e6
+
+    result = {
+        'name': name,
+        'events': events,
+        'seconds': seconds,
+        'events_per_second': events / seconds if seconds else None,
+        'latency_us': {
+            'mean': statistics.mean(latencies) * 1e6,
+            'p50': percentile(0.50),
+            'p90': percentile(0.90),
+            'p99': percentile(0.99),
+            'max': latencies[-1] * 1e6
+        }
+    }
+    result.update(extra)
+    return result
+
+
+async def run_case(harness, name, event, payloads_, *, latency_samples):
+    harness.listen(event.lower())
+    frames = [harness.frame(event, data) for data in payloads_]
+
+    gc.collect()
+    start = time.perf_counter()
+    await harness.feed(frames)
+    seconds = time.perf_counter() - start
+
+    latencies = []
+    for frame in frames[:latency_samples]:
+        start = time.perf_counter()
+        await harness.feed_one(frame)
+        latencies.append(time.perf_counter() - start)
+
+    return summarize(name, len(frames), seconds, latencies,
+                     bytes=sum(len(frame) for frame in frames))
+
+
+async def message_create(harness, scale):
+    guild = payloads.guild(members=100, channels=10)
+    harness.listen('guild_create')
+    await harness.feed_one(harness.frame('GUILD_CREATE', guild))
+
+    users = [member['user'] for member in guild['members']]
+    count = max(1, int(20000 * scale))
+    messages = [
+        payloads.message(
+            channel_id=guild['channels'][i % len(guild['channels'])]['id'],
+            guild_id=guild['id'],
+            author=users[i % len(users)]
+        )
+        for i in range(count)
+    ]
+
+    return await run_case(harness, 'message_create', 'MESSAGE_CREATE', messages,
+                          latency_samples=min(count, 1000))
+
+
+async def guild_create_small(harness, scale):
+    count = max(1, int(2000 * scale))
+    guilds = [payloads.guild(members=25, channels=10, roles=5) for _ in range(count)]
+
+    return await run_case(harness, 'guild_create_small', 'GUILD_CREATE', guilds,
+                          latency_samples=min(count, 200))
+
+
+async def guild_create_large(harness, scale):
+    count = max(1, int(3 * scale))
+    members = max(1, int(100000 * min(scale, 1)))
+    guilds = [payloads.guild(members=members, channels=50, roles=50) for _ in range(count)]
+
+    # The latency samples replay the same guilds, which is what a
+    # GUILD_CREATE for an already cached guild costs after a reconnect.
+    result = await run_case(harness, 'guild_create_large', 'GUILD_CREATE', guilds,
+                            latency_samples=count)
+    result['members'] = members
+    return result
+
+
+async def channel_update(harness, scale):
+    guild = payloads.guild(members=10, channels=50)
+    harness.listen('guild_create')
+    await harness.feed_one(harness.frame('GUILD_CREATE', guild))
+
+    count = max(1, int(20000 * scale))
+    updates = []
+    for i in range(count):
+        channel = dict(guild['channels'][i % len(guild['channels'])])
+        channel['name'] = 'renamed-%s' % i
+        channel['topic'] = 'topic %s' % i
+        updates.append(channel)
+
+    return await run_case(harness, 'channel_update', 'CHANNEL_UPDATE', updates,
+                          latency_samples=min(count, 1000))
+
+
+BENCHMARKS = {
+    'message_create': message_create,
+    'guild_create_small': guild_create_small,
+    'guild_create_large': guild_create_large,
+    'channel_update': channel_update,
+}
+
+
+async def run(names, scale):
+    loop = asyncio.get_event_loop()
+    results = []
+
+    for name in names:
+        # Every benchmark gets a cold client so caches don't leak between them.
+        harness = Harness(loop)
+        try:
+            results.append(await BENCHMARKS[name](harness, scale))
+        finally:
+            await harness.close()
+
+        print('{name:<20} {events_per_second:>12.1f} events/s  p50 {p50:>10.1f}us  '
+              'p99 {p99:>10.1f}us'.format(**results[-1], **results[-1]['latency_us']),
+              file=sys.stderr)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('names', nargs='*', metavar='name',
+                        help='benchmarks to run, one of %s (default: all)'
+                             % ', '.join(BENCHMARKS))
+    parser.add_argument('--output', '-o', help='write JSON results to this file')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply the number of events by this factor')
+    args = parser.parse_args(argv)
+
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error('unknown benchmark %r' % name)
+
+    results = asyncio.run(run(args.names or list(BENCHMARKS), args.scale))
+    report = {
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'scale': args.scale,
+        'results': results
+    }
+
+    data = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            fp.write(data)
+    else:
+        print(data)
+
+
+if __name__ == '__main__':
+    main()
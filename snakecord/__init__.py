@@ -2,6 +2,8 @@ from . import structures # noqa
 from .channel import * # noqa
 from .client import Client # noqa
 from .emoji import * # noqa
+from .enums import Intents # noqa
+from .file import File # noqa
 from .guild import * # noqa
 from .integration import * # noqa
 from .invite import * # noqa
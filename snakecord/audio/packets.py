@@ -1,5 +1,6 @@
 import asyncio
 import struct
+import zlib
 
 try:
     import opus
@@ -107,31 +108,173 @@ class OggPage(cstruct):
         return self
 
 
-async def get_packets(reader):
-    pending = b''
+# Ogg's CRC is the unreflected CRC-32, which is zlib's reflected CRC-32
+# run over bit reversed bytes and bit reversed again.
+_BIT_REVERSED = bytes(int('{:08b}'.format(i)[::-1], 2) for i in range(256))
+
 
-    while True:
-        try:
-            prefix = await reader.readexactly(len(OggPage.PREFIX))
-        except asyncio.IncompleteReadError:
-            return
+def ogg_crc(data):
+    crc = zlib.crc32(bytes(data).translate(_BIT_REVERSED), 0xFFFFFFFF) ^ 0xFFFFFFFF
+    return int('{:032b}'.format(crc)[::-1], 2)
+
+
+class OggDemuxer:
+    # Reads an Ogg stream in large chunks and yields the packets as
+    # memoryviews over those chunks, packets are only copied when they
+    # continue across pages.
+    HEADER = struct.Struct('<4sBBQIIIB')
+    CRC_OFFSET = 22
+
+    def __init__(self, reader, *, chunk_size=64 * 1024, verify_crc=False):
+        self.reader = reader
+        self.chunk_size = chunk_size
+        self.verify_crc = verify_crc
+
+        self.buffer = b''
+        self.offset = 0
+        self.eof = False
+
+        self.pages = 0
+        self.skipped = 0
+        self.crc_errors = 0
+
+    async def _fill(self, size):
+        # Makes sure `size` bytes are buffered past the offset, the consumed
+        # part of the buffer is only dropped when reading more.
+        while len(self.buffer) - self.offset < size:
+            if self.eof:
+                return False
+
+            chunk = await self.reader.read(max(self.chunk_size, size))
+            if not chunk:
+                self.eof = True
+                return False
+
+            self.buffer = self.buffer[self.offset:] + chunk
+            self.offset = 0
+
+        return True
+
+    async def _sync(self):
+        prefix = OggPage.PREFIX
+
+        while True:
+            index = self.buffer.find(prefix, self.offset)
+            if index != -1:
+                self.skipped += index - self.offset
+                self.offset = index
+                return True
+
+            # Keep a tail that could be the start of a split prefix.
+            keep = max(self.offset, len(self.buffer) - len(prefix) + 1)
+            self.skipped += keep - self.offset
+            self.offset = keep
+
+            if not await self._fill(len(prefix)):
+                return False
+
+    def _check_crc(self, page):
+        crc = int.from_bytes(page[self.CRC_OFFSET:self.CRC_OFFSET + 4], 'little')
+        page = bytearray(page)
+        page[self.CRC_OFFSET:self.CRC_OFFSET + 4] = bytes(4)
+        return ogg_crc(page) == crc
+
+    def _false_sync(self):
+        # The stream ended inside a page that has not been checked yet. With
+        # CRCs on, its header may have come from a false prefix in corrupt
+        # data, so the rest of the buffer is still searched for real pages.
+        if not self.verify_crc:
+            return False
+
+        self.crc_errors += 1
+        self.offset += 1
+        return True
+
+    async def read_page(self):
+        # Returns (header_type, segment_table, data) or None at the end
+        # of the stream.
+        size = self.HEADER.size
 
-        if prefix != OggPage.PREFIX:
-            continue
+        while await self._sync():
+            if not await self._fill(size):
+                return None
 
-        packet_start = packet_end = 0
+            start = self.offset
+            header = self.HEADER.unpack_from(self.buffer, start)
+            page_segments = header[7]
 
-        page = await OggPage.new(reader)
+            if not await self._fill(size + page_segments):
+                if self._false_sync():
+                    continue
+                return None
+
+            start = self.offset
+            table_end = start + size + page_segments
+            segment_table = self.buffer[start + size:table_end]
+            length = sum(segment_table)
+
+            if not await self._fill(size + page_segments + length):
+                if self._false_sync():
+                    continue
+                return None
+
+            start = self.offset
+            table_end = start + size + page_segments
+            end = table_end + length
+
+            view = memoryview(self.buffer)
+            if self.verify_crc and not self._check_crc(view[start:end]):
+                # Not a real page boundary or a corrupt page, look for the
+                # next prefix after this one.
+                self.crc_errors += 1
+                self.offset = start + 1
+                continue
+
+            self.offset = end
+            self.pages += 1
+            return header[2], self.buffer[start + size:table_end], view[table_end:end]
+
+        return None
+
+    async def packets(self):
+        pending = []
+
+        while True:
+            page = await self.read_page()
+            if page is None:
+                return
+
+            header_type, segment_table, data = page
+
+            if pending and not header_type & 0x01:
+                # The packet that was being continued never finished.
+                pending = []
 
-        for segment in page.segment_table:
-            packet_end += segment
-            pending += page.data[packet_start:packet_end]
+            packet_start = packet_end = 0
+            for segment in segment_table:
+                packet_end += segment
+
+                if segment == 0xFF:
+                    continue
+
+                packet = data[packet_start:packet_end]
+                if pending:
+                    pending.append(packet)
+                    packet = memoryview(b''.join(pending))
+                    pending = []
+
+                yield packet
+                packet_start = packet_end
+
+            if packet_start != packet_end:
+                pending.append(data[packet_start:packet_end])
+
+    def __aiter__(self):
+        return self.packets()
 
-            if segment != 0xFF:
-                yield pending
-                pending = b''
 
-            packet_start = packet_end
+def get_packets(reader, *, verify_crc=False):
+    return OggDemuxer(reader, verify_crc=verify_crc).packets()
 
 
 async def get_packets_encoded(reader, loop, encoder=None):
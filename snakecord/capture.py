@@ -0,0 +1,156 @@
+import asyncio
+import collections
+import concurrent.futures
+import gzip
+import os
+import struct
+import time
+
+from .logger import CONNECTION_LOGGER
+
+MAGIC = b'SNAKECAP1\n'
+GZIP_MAGIC = b'\x1f\x8b'
+
+# timestamp, shard id, first frame byte, payload length
+RECORD = struct.Struct('>dHBI')
+
+CaptureRecord = collections.namedtuple(
+    'CaptureRecord', ('timestamp', 'shard_id', 'fbyte', 'data')
+)
+
+
+class GatewayCapture:
+    # Appends every websocket frame shards receive to a file, see
+    # read_capture and snakecord.testing.replay for reading it back.
+    # Records are buffered in memory and written, compressed if asked to,
+    # by a single worker thread so the event loop never touches the disk.
+    def __init__(self, path, *, compress=None, flush_interval=1.0, buffer_size=256 * 1024):
+        if compress is None:
+            compress = str(path).endswith('.gz')
+
+        self.path = path
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+
+        if compress:
+            self.fp = gzip.open(path, 'ab')
+        else:
+            self.fp = open(path, 'ab')
+
+        if new:
+            self.fp.write(MAGIC)
+
+        self.frames = 0
+        self.bytes = 0
+
+        self._pending = []
+        self._pending_size = 0
+        self._handle = None
+        # One worker keeps the chunks in order.
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    @property
+    def closed(self):
+        return self.fp is None
+
+    def write(self, shard_id, fbyte, data):
+        if self.fp is None:
+            return
+
+        self._pending.append(RECORD.pack(time.time(), shard_id, fbyte, len(data)))
+        self._pending.append(data)
+        self._pending_size += RECORD.size + len(data)
+
+        self.frames += 1
+        self.bytes += len(data)
+
+        if self._pending_size >= self.buffer_size:
+            self.flush()
+        elif self._handle is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.flush()
+            else:
+                # Quiet shards still reach the disk within flush_interval.
+                self._handle = loop.call_later(self.flush_interval, self.flush)
+
+    def _write_chunks(self, chunks):
+        self.fp.write(b''.join(chunks))
+        self.fp.flush()
+
+    def _write_done(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            CONNECTION_LOGGER.error(
+                'Failed to write gateway capture %s', self.path, exc_info=future.exception()
+            )
+
+    def flush(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+        if self.fp is None or not self._pending:
+            return
+
+        chunks = self._pending
+        self._pending = []
+        self._pending_size = 0
+
+        future = self._executor.submit(self._write_chunks, chunks)
+        future.add_done_callback(self._write_done)
+
+    def close(self):
+        # Blocks until everything buffered is written.
+        if self.fp is None:
+            return
+
+        self.flush()
+        self._executor.shutdown(wait=True)
+        self.fp.close()
+        self.fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return '<GatewayCapture path={0.path!r} frames={0.frames} ' \
+               'bytes={0.bytes}>'.format(self)
+
+
+def read_capture(path):
+    with open(path, 'rb') as fp:
+        compressed = fp.read(2) == GZIP_MAGIC
+
+    if compressed:
+        fp = gzip.open(path, 'rb')
+    else:
+        fp = open(path, 'rb')
+
+    with fp:
+        try:
+            if fp.read(len(MAGIC)) != MAGIC:
+                raise ValueError('%s is not a gateway capture' % path)
+
+            while True:
+                header = fp.read(RECORD.size)
+                if len(header) < RECORD.size:
+                    # A capture cut short by a crash just ends early.
+                    return
+
+                timestamp, shard_id, fbyte, length = RECORD.unpack(header)
+                data = fp.read(length)
+                if len(data) < length:
+                    return
+
+                yield CaptureRecord(timestamp, shard_id, fbyte, data)
+        except (EOFError, gzip.BadGzipFile):
+            # A compressed capture of a process that died has no gzip
+            # trailer, everything up to the last complete record is kept.
+            return
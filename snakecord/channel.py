@@ -5,9 +5,11 @@ if TYPE_CHECKING:
 
 from . import structures
 from .enums import ChannelType
+from .file import File
 from .invite import ChannelInviteState
 from .message import MessageState
 from .permissions import PermissionOverwriteState
+from .rest import RequestPriority
 from .state import BaseState
 from .utils import _try_snowflake, undefined
 from .voice import VoiceConnection, VoiceState
@@ -73,11 +75,29 @@ class TextChannel(GuildChannel, structures.TextChannel):
         message = self.messages._add(data)
         return message
 
-    async def send(self, content=None, *, nonce=None, tts=False, embed=None) -> None:
+    async def send(
+        self, content=None, *, nonce=None, tts=False, embed=None, file=None,
+        files=None, deadline=None, priority=RequestPriority.NORMAL
+    ) -> None:
         rest = self._state.client.rest
         if embed is not None:
             embed = embed.to_dict()
-        data = await rest.send_message(self.id, content=content, nonce=nonce, tts=tts, embed=embed)
+
+        files = list(files or ())
+        if file is not None:
+            files.insert(0, file)
+
+        files = [f if isinstance(f, File) else File(f) for f in files]
+
+        try:
+            data = await rest.send_message(
+                self.id, content=content, nonce=nonce, tts=tts, embed=embed,
+                files=files, deadline=deadline, priority=priority
+            )
+        finally:
+            for f in files:
+                f.close()
+
         message = self.messages._add(data)
         return message
 
@@ -189,13 +209,20 @@ class GuildChannelState(ChannelState):
     def __init__(self, channel_state: ChannelState, guild: 'Guild'):
         self.guild = guild
         self.client = channel_state.client
-        self._items = channel_state._items
+        # Only this guild's channels, the objects are shared with the
+        # client's ChannelState.
+        self._items = {}
         self._channel_state = channel_state
 
-    def __iter__(self):
-        for channel in self._channel_state:
-            if channel.guild == self.guild:
-                yield channel
+    def _add(self, data, *args, **kwargs):
+        channel = self._channel_state._add(data, guild=self.guild)
+        self._items[channel.id] = channel
+        return channel
+
+    def pop(self, item, *args, **kwargs):
+        item = _try_snowflake(item)
+        self._channel_state.pop(item, None)
+        return super().pop(item, *args, **kwargs)
 
     async def fetch_all(self):
         rest = self.client.rest
@@ -6,6 +6,7 @@ from .rest import RestSession
 from .invite import InviteState
 from .events import EventPusher
 from .gateway import Sharder
+from .metrics import Metrics
 
 
 class Client(EventPusher):
@@ -18,7 +19,9 @@ class Client(EventPusher):
         user_state=None,
         invite_state=None,
         sharder=None,
-        max_shards=1
+        max_shards=1,
+        intents=None,
+        lazy_members=False
     ):
         self.loop = loop or asyncio.get_event_loop()
 
@@ -29,8 +32,13 @@ class Client(EventPusher):
         self.guilds = guild_state or GuildState(self)
         self.users = user_state or UserState(self)
         self.invites = invite_state or InviteState(self)
-        self.sharder = sharder or Sharder(self, max_shards=max_shards)
+        self.sharder = sharder or Sharder(self, max_shards=max_shards, intents=intents)
+        self.metrics = Metrics(self)
         self.token = None
+        # Set from READY.
+        self.user = None
+        # Cache misses on guild members are fetched over the gateway in batches.
+        self.lazy_members = lazy_members
 
         self.subscribe(self.sharder)
 
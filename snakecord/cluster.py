@@ -0,0 +1,367 @@
+import asyncio
+import multiprocessing
+import time
+
+from enum import IntEnum
+
+from .events import EventPusher
+from .gateway import IdentifyScheduler
+from .logger import CLUSTER_LOGGER
+from .rest import RestSession
+
+
+class ClusterOpcode(IntEnum):
+    IDENTIFY = 0
+    IDENTIFY_ACK = 1
+    PING = 2
+    PONG = 3
+    EVENT = 4
+    STOP = 5
+
+
+class RemoteIdentifyScheduler:
+    # Stands in for IdentifyScheduler inside a worker, every identify is
+    # cleared with the supervisor, which owns the real buckets.
+    def __init__(self, worker):
+        self.worker = worker
+        self.loop = worker.loop
+        self._waiters = {}
+
+    async def acquire(self, shard_id):
+        fut = self._waiters.get(shard_id)
+        if fut is None or fut.done():
+            fut = self.loop.create_future()
+            self._waiters[shard_id] = fut
+            self.worker.send(ClusterOpcode.IDENTIFY, shard_id)
+
+        await fut
+
+    def release(self, shard_id):
+        fut = self._waiters.pop(shard_id, None)
+        if fut is not None and not fut.done():
+            fut.set_result(None)
+
+
+class ClusterWorker:
+    def __init__(
+        self,
+        loop,
+        conn,
+        *,
+        cluster_id,
+        token,
+        shard_ids,
+        shard_count,
+        gateway_data,
+        forward_events,
+        client_factory
+    ):
+        self.loop = loop
+        self.conn = conn
+        self.cluster_id = cluster_id
+        self.token = token
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.gateway_data = gateway_data
+        self.forward_events = forward_events
+        self.client_factory = client_factory
+        self.client = None
+
+    def send(self, *message):
+        try:
+            self.conn.send(message)
+        except (BrokenPipeError, EOFError, OSError):
+            self.loop.stop()
+
+    def forward(self, name, data):
+        # Events are forwarded raw, objects attached to this process' caches
+        # can't cross the pipe anyway.
+        self.send(ClusterOpcode.EVENT, name, [data])
+
+    def stats(self):
+        shards = {}
+        for shard_id, shard in self.client.sharder.shards.items():
+            handler = shard.heartbeat_handler
+            shards[shard_id] = {
+                'latency': handler.latency,
+                'connected': shard.transport is not None and not shard.transport.is_closing()
+            }
+        return shards
+
+    def _read(self):
+        try:
+            while self.conn.poll():
+                self.handle(*self.conn.recv())
+        except (EOFError, OSError):
+            # The supervisor went away, there is nobody left to report to.
+            self.loop.stop()
+
+    def handle(self, op, *args):
+        if op == ClusterOpcode.IDENTIFY_ACK:
+            self.client.sharder.identify_scheduler.release(*args)
+        elif op == ClusterOpcode.PING:
+            self.send(ClusterOpcode.PONG, args[0], self.stats())
+        elif op == ClusterOpcode.STOP:
+            self.loop.stop()
+
+    async def start(self):
+        self.client = self.client_factory(loop=self.loop)
+        self.client.token = self.token
+
+        sharder = self.client.sharder
+        sharder.shard_ids = self.shard_ids
+        sharder.shard_count = self.shard_count
+        sharder.gateway_data = self.gateway_data
+        sharder.identify_scheduler = RemoteIdentifyScheduler(self)
+
+        for name in self.forward_events:
+            sharder.register_raw_listener(name, self._make_forwarder(name))
+
+        self.loop.add_reader(self.conn.fileno(), self._read)
+        await sharder.connect()
+
+    def _make_forwarder(self, name):
+        def forwarder(data):
+            self.forward(name, data)
+        return forwarder
+
+
+def _run_worker(conn, client_factory, **kwargs):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    worker = ClusterWorker(loop, conn, client_factory=client_factory, **kwargs)
+    loop.create_task(worker.start())
+
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+class ClusterProcess:
+    def __init__(self, cluster_id, shard_ids):
+        self.id = cluster_id
+        self.shard_ids = shard_ids
+        self.process = None
+        self.conn = None
+        self.restarts = 0
+        self.last_ping = None
+        self.last_pong = None
+        self.shards = {}
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def __repr__(self):
+        return '<ClusterProcess id={0.id} shards={0.shard_ids} alive={0.alive}>'.format(self)
+
+
+class ClusterSupervisor(EventPusher):
+    def __init__(
+        self,
+        token,
+        *,
+        clusters=None,
+        shard_count=None,
+        forward_events=(),
+        client_factory=None,
+        gateway_data=None,
+        health_interval=15.0,
+        health_timeout=45.0,
+        stop_timeout=1.0,
+        loop=None,
+        context=None
+    ):
+        self.loop = loop or asyncio.get_event_loop()
+        super().__init__(self.loop)
+
+        if client_factory is None:
+            from .client import Client
+            client_factory = Client
+
+        self.token = token
+        self.clusters = {}
+        self.cluster_count = clusters or multiprocessing.cpu_count()
+        self.shard_count = shard_count
+        self.forward_events = tuple(name.lower() for name in forward_events)
+        self.client_factory = client_factory
+        self.gateway_data = gateway_data
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.context = context or multiprocessing.get_context('spawn')
+
+        self.stop_timeout = stop_timeout
+        self.identify_scheduler = None
+        self._health_task = None
+        self._reapers = set()
+        self.stopped = False
+
+    def split_shards(self):
+        per_cluster, extra = divmod(self.shard_count, self.cluster_count)
+        start = 0
+
+        for cluster_id in range(self.cluster_count):
+            size = per_cluster + (cluster_id < extra)
+            if size:
+                yield cluster_id, list(range(start, start + size))
+            start += size
+
+    def spawn(self, cluster):
+        parent_conn, child_conn = self.context.Pipe()
+
+        cluster.conn = parent_conn
+        cluster.process = self.context.Process(
+            target=_run_worker,
+            args=(child_conn, self.client_factory),
+            kwargs=dict(
+                cluster_id=cluster.id,
+                token=self.token,
+                shard_ids=cluster.shard_ids,
+                shard_count=self.shard_count,
+                gateway_data=self.gateway_data,
+                forward_events=self.forward_events
+            ),
+            daemon=True
+        )
+        cluster.process.start()
+        child_conn.close()
+
+        cluster.last_ping = cluster.last_pong = time.monotonic()
+        self.loop.add_reader(parent_conn.fileno(), self._read, cluster)
+
+        CLUSTER_LOGGER.info('Started cluster %s (pid %s) with shards %s',
+                            cluster.id, cluster.process.pid, cluster.shard_ids)
+
+    def terminate(self, cluster):
+        if cluster.conn is not None:
+            self.loop.remove_reader(cluster.conn.fileno())
+            try:
+                cluster.conn.send((ClusterOpcode.STOP,))
+            except (BrokenPipeError, EOFError, OSError):
+                pass
+            cluster.conn.close()
+            cluster.conn = None
+
+        if cluster.process is not None:
+            task = self.loop.create_task(self._reap(cluster.process))
+            self._reapers.add(task)
+            task.add_done_callback(self._reapers.discard)
+            cluster.process = None
+
+    async def _wait_exit(self, process, timeout):
+        # Polled rather than joined so the loop keeps serving the other clusters.
+        deadline = self.loop.time() + timeout
+        while process.is_alive():
+            if self.loop.time() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    async def _reap(self, process):
+        if not await self._wait_exit(process, self.stop_timeout):
+            process.terminate()
+            if not await self._wait_exit(process, self.stop_timeout):
+                CLUSTER_LOGGER.warning('Killing unresponsive cluster process %s', process.pid)
+                process.kill()
+                await self._wait_exit(process, self.stop_timeout)
+
+        # Already exited, this only collects the exit status.
+        process.join(0)
+
+    def restart(self, cluster):
+        CLUSTER_LOGGER.warning('Restarting cluster %s', cluster.id)
+
+        self.terminate(cluster)
+        cluster.restarts += 1
+        cluster.shards = {}
+
+        self.spawn(cluster)
+        self.push_event('cluster_restart', cluster)
+
+    def _read(self, cluster):
+        try:
+            while cluster.conn is not None and cluster.conn.poll():
+                self.handle(cluster, *cluster.conn.recv())
+        except (EOFError, OSError):
+            if not self.stopped:
+                self.restart(cluster)
+
+    async def _identify(self, cluster, shard_id):
+        # The process that asked may have been restarted while this waited,
+        # its replacement sends its own IDENTIFY.
+        conn = cluster.conn
+        await self.identify_scheduler.acquire(shard_id)
+
+        if conn is not None and cluster.conn is conn and shard_id in cluster.shard_ids:
+            try:
+                conn.send((ClusterOpcode.IDENTIFY_ACK, shard_id))
+            except (BrokenPipeError, EOFError, OSError):
+                pass
+
+    def handle(self, cluster, op, *args):
+        if op == ClusterOpcode.IDENTIFY:
+            self.loop.create_task(self._identify(cluster, *args))
+        elif op == ClusterOpcode.PONG:
+            cluster.last_pong = time.monotonic()
+            cluster.shards = args[1]
+        elif op == ClusterOpcode.EVENT:
+            name, data = args
+            self.push_event(name, *data)
+
+    async def _health_check(self):
+        while not self.stopped:
+            await asyncio.sleep(self.health_interval)
+            now = time.monotonic()
+
+            for cluster in self.clusters.values():
+                if not cluster.alive or now - cluster.last_pong > self.health_timeout:
+                    self.restart(cluster)
+                    continue
+
+                cluster.last_ping = now
+                try:
+                    cluster.conn.send((ClusterOpcode.PING, now))
+                except (BrokenPipeError, EOFError, OSError):
+                    self.restart(cluster)
+
+    async def start(self):
+        if self.gateway_data is None:
+            rest = RestSession(self)
+            try:
+                self.gateway_data = await rest.get_gateway_bot()
+            finally:
+                await rest.client_session.close()
+
+        if self.shard_count is None:
+            self.shard_count = self.gateway_data['shards']
+
+        self.identify_scheduler = IdentifyScheduler.from_session_start_limit(
+            self.loop, self.gateway_data['session_start_limit']
+        )
+
+        for cluster_id, shard_ids in self.split_shards():
+            cluster = ClusterProcess(cluster_id, shard_ids)
+            self.clusters[cluster_id] = cluster
+            self.spawn(cluster)
+
+        self._health_task = self.loop.create_task(self._health_check())
+
+    def stop(self):
+        self.stopped = True
+
+        if self._health_task is not None:
+            self._health_task.cancel()
+
+        for cluster in self.clusters.values():
+            self.terminate(cluster)
+
+    def run(self):
+        self.loop.create_task(self.start())
+        try:
+            self.loop.run_forever()
+        except KeyboardInterrupt:
+            self.stop()
+            if self._reapers:
+                self.loop.run_until_complete(asyncio.gather(*self._reapers))
@@ -4,15 +4,21 @@ import base64
 import json
 import time
 import platform
-import functools
+import random
 import asyncio
+import collections
+import math
 import urllib.parse
+import weakref
 
 from enum import IntEnum
 
+from . import profiling
+from .capture import GatewayCapture
 from .events import EventPusher
 from .utils import JsonStructure, JsonField, cstruct
 from .exceptions import BadWsHttpResponse
+from .logger import CONNECTION_LOGGER
 
 
 class WebsocketOpcode(IntEnum):
@@ -62,6 +68,13 @@ class WebsocketFrame(cstruct):
         for i in range(len(data)):
             data[i] ^= mask[i % 4]
 
+    @staticmethod
+    def unmask(mask, data):
+        length = len(data)
+        key = (mask * (length // 4 + 1))[:length]
+        value = int.from_bytes(data, 'big') ^ int.from_bytes(key, 'big')
+        return value.to_bytes(length, 'big')
+
     @classmethod
     def create_frame(
         cls, data, *, opcode=WebsocketOpcode.TEXT,
@@ -116,6 +129,7 @@ class WebsocketProtocolState(IntEnum):
     WAITING_SBYTE = 1
     WAITING_LENGTH = 2
     WAITING_DATA = 3
+    WAITING_MASK = 4
 
 
 class WebsocketProtocol(asyncio.Protocol):
@@ -125,6 +139,33 @@ class WebsocketProtocol(asyncio.Protocol):
         self.frame = WebsocketFrame()
         self.headers = b''
         self.have_headers = asyncio.Event()
+        self.bytes_received = 0
+
+    def frame_received(self, frame):
+        self.connection.push_event('ws_frame_receive', frame)
+
+    def _payload_expected(self):
+        if WebsocketFrame.get_mask(self.frame.sbyte):
+            self.frame.mask = b''
+            self.state = WebsocketProtocolState.WAITING_MASK
+        else:
+            self.frame.mask = None
+            self._data_expected()
+
+    def _data_expected(self):
+        self.frame.bytes_needed = self.frame.length
+        self.state = WebsocketProtocolState.WAITING_DATA
+
+        if self.frame.length == 0:
+            self._frame_complete()
+
+    def _frame_complete(self):
+        if self.frame.mask is not None:
+            self.frame.data = WebsocketFrame.unmask(self.frame.mask, self.frame.data)
+
+        self.frame_received(self.frame)
+        self.frame = WebsocketFrame()
+        self.state = WebsocketProtocolState.WAITING_FBYTE
 
     def create_frames(self, data):
         position = 0
@@ -156,8 +197,7 @@ class WebsocketProtocol(asyncio.Protocol):
                     elif self.frame.length == 127:
                         self.frame.bytes_needed = cstruct.UnsignedLongLong.size
                 else:
-                    self.frame.bytes_needed = self.frame.length
-                    self.state = WebsocketProtocolState.WAITING_DATA
+                    self._payload_expected()
 
             if position >= len(data):
                 return
@@ -170,8 +210,18 @@ class WebsocketProtocol(asyncio.Protocol):
 
                 if self.frame.bytes_needed == 0:
                     self.frame.length = int.from_bytes(self.frame.length_buffer, 'big', signed=False)
-                    self.frame.bytes_needed = self.frame.length
-                    self.state = WebsocketProtocolState.WAITING_DATA
+                    self._payload_expected()
+
+            if position >= len(data):
+                return
+
+            if self.state == WebsocketProtocolState.WAITING_MASK:
+                mask_bytes = data[position:position + 4 - len(self.frame.mask)]
+                position += len(mask_bytes)
+                self.frame.mask += mask_bytes
+
+                if len(self.frame.mask) == 4:
+                    self._data_expected()
 
             if position >= len(data):
                 return
@@ -183,22 +233,41 @@ class WebsocketProtocol(asyncio.Protocol):
                 self.frame.data += data_bytes
 
                 if self.frame.bytes_needed == 0:
-                    self.connection.push_event('ws_frame_receive', self.frame)
-                    self.frame = WebsocketFrame()
-                    self.state = WebsocketProtocolState.WAITING_FBYTE
+                    self._frame_complete()
 
             if position >= len(data):
                 return
 
+    def connection_lost(self, exc):
+        # A connection that has already moved on to a new transport doesn't
+        # care about the old one going away.
+        if self.connection.protocol is self:
+            self.connection.push_event('connection_lost', exc)
+
     def data_received(self, data):
+        profiler = profiling.profiler
+        if profiler is None:
+            return self._data_received(data)
+
+        start = profiler.enter()
+        try:
+            self._data_received(data)
+        finally:
+            profiler.exit('websocket.data_received', start, bytes=len(data))
+
+    def _data_received(self, data):
+        self.bytes_received += len(data)
+
         if not self.have_headers.is_set():
+            data = self.headers + data
             try:
                 index = data.index(b'\r\n\r\n')
-                self.headers += data[:index + 4]
+            except ValueError:
+                self.headers = data
+            else:
+                self.headers = data[:index + 4]
                 self.have_headers.set()
                 self.create_frames(data[index + 4:])
-            except ValueError:
-                self.headers += data
         else:
             self.create_frames(data)
 
@@ -221,13 +290,22 @@ class BaseConnection(EventPusher):
         self.pusher = pusher
 
         self.register_listener('connection_stale', self.connection_stale)
+        self.register_listener('connection_lost', self.connection_lost)
         self.register_listener('ws_frame_receive', self.ws_frame_receive)
         self.register_listener('ws_receive', self.ws_receive)
+        self.register_listener('ws_close', self.ws_close)
 
         self.heartbeat_handler = HeartbeatHandler(self)
 
         self.transport = None
         self.protocol = None
+        self.closing = False
+
+        self.bytes_sent = 0
+        self.frames_received = 0
+        self.decode_time = 0.0
+        # bytes read by protocols of earlier connections
+        self._bytes_received = 0
 
         self.sec_ws_key = base64.b64encode(os.urandom(16))
 
@@ -238,14 +316,65 @@ class BaseConnection(EventPusher):
     async def connection_stale(self):
         raise NotImplementedError
 
+    def connection_lost(self, exc):
+        pass
+
     def ws_frame_receive(self, frame):
-        if WebsocketFrame.get_opcode(frame.fbyte) == WebsocketOpcode.TEXT:
-            response = DiscordResponse.unmarshal(frame.data)
+        opcode = WebsocketFrame.get_opcode(frame.fbyte)
+
+        if opcode == WebsocketOpcode.TEXT:
+            profiler = profiling.profiler
+            if profiler is not None:
+                profile_start = profiler.enter()
+
+            start = time.perf_counter()
+            try:
+                response = DiscordResponse.unmarshal(frame.data)
+            finally:
+                if profiler is not None:
+                    profiler.exit('connection.decode', profile_start, bytes=len(frame.data))
+
+            self.decode_time += time.perf_counter() - start
+            self.frames_received += 1
+
             self.push_event('ws_receive', response)
+        elif opcode == WebsocketOpcode.CLOSE:
+            if len(frame.data) >= 2:
+                code = int.from_bytes(frame.data[:2], 'big', signed=False)
+            else:
+                code = None
+            self.push_event('ws_close', code)
 
-    async def ws_receive(self, response):
+    def ws_receive(self, response):
         raise NotImplementedError
 
+    @property
+    def bytes_received(self):
+        if self.protocol is None:
+            return self._bytes_received
+        return self._bytes_received + self.protocol.bytes_received
+
+    def ws_close(self, code):
+        self.close()
+
+    def _set_reading(self, reading):
+        if self.transport is None or self.transport.is_closing():
+            return
+
+        if reading:
+            self.transport.resume_reading()
+        else:
+            self.transport.pause_reading()
+
+    def close(self, code=1000):
+        self.closing = True
+        self.heartbeat_handler.stop()
+
+        if self.transport is not None and not self.transport.is_closing():
+            data = code.to_bytes(2, 'big', signed=False)
+            self.send(data, opcode=WebsocketOpcode.CLOSE)
+            self.transport.close()
+
     def form_headers(self, meth, path, headers):
         parts = ['%s %s HTTP/1.0' % (meth, path)]
 
@@ -269,12 +398,26 @@ class BaseConnection(EventPusher):
     async def connect(self, **kwargs):
         headers = kwargs.pop('headers', {})
 
+        self.closing = False
+        self.heartbeat_handler = HeartbeatHandler(self)
+        self.sec_ws_key = base64.b64encode(os.urandom(16))
+
         url = urllib.parse.urlparse(self.endpoint)
 
+        secure = url.scheme in ('wss', 'https')
+        kwargs.setdefault('port', url.port or (443 if secure else 80))
+        kwargs.setdefault('ssl', secure)
+
+        if self.protocol is not None:
+            self._bytes_received += self.protocol.bytes_received
+
         self.transport, self.protocol = await self.loop.create_connection(
             lambda: WebsocketProtocol(self), url.hostname, **kwargs
         )
 
+        if self._pause_count:
+            self.transport.pause_reading()
+
         headers.update({
             'Host': url.hostname,
             'Connection': 'Upgrade',
@@ -283,7 +426,9 @@ class BaseConnection(EventPusher):
             'Sec-WebSocket-Version': 13
         })
 
-        path = (url.path + url.params) or '/'
+        path = url.path or '/'
+        if url.query:
+            path += '?' + url.query
         self.transport.write(self.form_headers('GET', path, headers))
 
         await self.protocol.have_headers.wait()
@@ -310,16 +455,109 @@ class BaseConnection(EventPusher):
 
     def send(self, data, *args, **kwargs):
         data = WebsocketFrame.create_frame(data, *args, **kwargs)
+        self.bytes_sent += len(data)
         self.transport.write(data)
 
     def send_json(self, data):
         self.send(json.dumps(data).encode())
 
 
+class HeartbeatScheduler:
+    # Drives the heartbeats of every connection on a loop from a single
+    # hashed timer wheel, so a process with hundreds of shards keeps one
+    # timer handle instead of one per shard.
+    _schedulers = weakref.WeakKeyDictionary()
+
+    def __init__(self, loop, *, resolution=0.1, slots=512):
+        self.loop = loop
+        self.resolution = resolution
+        self.slots = [set() for _ in range(slots)]
+        self.origin = loop.time()
+        self.tick = 0
+        self.scheduled = 0
+        self.handle = None
+        self._advancing = False
+
+    @classmethod
+    def get(cls, loop):
+        scheduler = cls._schedulers.get(loop)
+        if scheduler is None:
+            scheduler = cls(loop)
+            cls._schedulers[loop] = scheduler
+        return scheduler
+
+    def _current_tick(self):
+        return int((self.loop.time() - self.origin) / self.resolution)
+
+    def schedule(self, handler, delay):
+        self.cancel(handler)
+
+        if not self.scheduled:
+            # Nothing was due while the wheel sat idle.
+            self.tick = self._current_tick()
+
+        tick = math.ceil((self.loop.time() + delay - self.origin) / self.resolution)
+        handler._tick = max(tick, self.tick + 1)
+        self.slots[handler._tick % len(self.slots)].add(handler)
+        self.scheduled += 1
+
+        # Handlers that reschedule while firing are picked up when
+        # _advance re-arms, arming here too would start a second timer.
+        if self.handle is None and not self._advancing:
+            self._arm()
+
+    def cancel(self, handler):
+        if handler._tick is None:
+            return
+
+        self.slots[handler._tick % len(self.slots)].discard(handler)
+        handler._tick = None
+        self.scheduled -= 1
+
+    def _arm(self):
+        when = self.origin + (self.tick + 1) * self.resolution
+        self.handle = self.loop.call_at(when, self._advance)
+
+    def _advance(self):
+        self.handle = None
+        current = self._current_tick()
+        self._advancing = True
+
+        try:
+            self._run_due(current)
+        finally:
+            self._advancing = False
+
+        if self.scheduled and self.handle is None:
+            self._arm()
+
+    def _run_due(self, current):
+        while self.tick < current:
+            self.tick += 1
+            slot = self.slots[self.tick % len(self.slots)]
+            if not slot:
+                continue
+
+            # Handlers further out than one turn of the wheel share the
+            # slot with the ones due now.
+            due = [handler for handler in slot if handler._tick <= self.tick]
+            for handler in due:
+                slot.discard(handler)
+                handler._tick = None
+                self.scheduled -= 1
+
+            for handler in due:
+                try:
+                    handler.fire()
+                except Exception:
+                    CONNECTION_LOGGER.exception('Heartbeat for %r failed', handler.connection)
+
+
 class HeartbeatHandler:
-    def __init__(self, connection, *, timeout=10):
+    def __init__(self, connection, *, timeout=10, history=100):
         self.connection = connection
         self.loop = connection.loop
+        self.scheduler = HeartbeatScheduler.get(self.loop)
         self.timeout = timeout
 
         self.heartbeat_interval = float('inf')
@@ -327,52 +565,114 @@ class HeartbeatHandler:
         self.heartbeats_acked = 0
         self.last_sent = float('inf')
         self.last_acked = float('inf')
+        self.latencies = collections.deque(maxlen=history)
 
-        self.current_handle = None
+        self.awaiting_ack = False
         self.stopped = False
+        self._tick = None
 
-    def do_heartbeat(self):
+    def start(self):
+        # Discord asks for the first heartbeat to be sent after
+        # heartbeat_interval * jitter, so reconnecting shards don't beat
+        # in lockstep.
+        self.stopped = False
+        self.awaiting_ack = False
+        self.scheduler.schedule(self, self.heartbeat_interval * random.random())
+
+    def fire(self):
         if self.stopped:
             return
 
-        func = functools.partial(self.loop.create_task, self.send_heartbeat())
-        self.current_handle = self.loop.call_later(self.heartbeat_interval, func)
-
-    async def send_heartbeat(self):
-        if self.stopped:
+        if self.awaiting_ack:
+            self.stop()
+            self.connection.push_event('connection_stale')
             return
 
-        paylod = self.connection.heartbeat_payload
+        self.send_heartbeat()
+
+    def send_heartbeat(self):
         self.last_sent = time.perf_counter()
-        self.connection.send_json(paylod)
+        self.heartbeats_sent += 1
+        self.awaiting_ack = True
+        self.connection.send_json(self.connection.heartbeat_payload)
 
-        await self.wait_ack()
+        self.scheduler.schedule(self, min(self.timeout, self.heartbeat_interval))
 
-        self.do_heartbeat()
+    def ack(self):
+        self.last_acked = time.perf_counter()
 
-    async def wait_ack(self):
-        try:
-            await self.connection.wait(
-                'heartbeat_ack',
-                timeout=self.timeout,
-            )
-            self.last_acked = time.perf_counter()
-            self.heartbeats_acked += 1
-        except asyncio.TimeoutError:
-            self.stop()
-            self.connection.push_event('connection_stale')
+        if not self.awaiting_ack:
+            # An ACK for a heartbeat the gateway requested with op 1.
+            return False
 
-    def start(self):
-        self.loop.create_task(self.send_heartbeat())
+        self.awaiting_ack = False
+        self.heartbeats_acked += 1
+        self.latencies.append(self.last_acked - self.last_sent)
+
+        if not self.stopped:
+            delay = self.last_sent + self.heartbeat_interval - self.last_acked
+            self.scheduler.schedule(self, max(delay, 0))
+
+        return True
 
     def stop(self):
         self.stopped = True
-        if self.current_handle is not None:
-            self.current_handle.cancel()
+        self.scheduler.cancel(self)
 
     @property
     def latency(self):
-        return self.last_acked - self.last_sent
+        if not self.latencies:
+            return float('inf')
+        return self.latencies[-1]
+
+
+class GatewaySendLimiter:
+    # Discord closes a shard with 4008 once it sends more than 120 payloads
+    # a minute. Every payload is counted here, the ones that can wait, like
+    # member requests, are held back so heartbeats always have room left.
+    def __init__(self, connection, *, rate=120, per=60.0, reserve=10):
+        self.connection = connection
+        self.loop = connection.loop
+        self.rate = rate
+        self.per = per
+        self.reserve = reserve
+
+        self._sent = collections.deque()
+        self._queue = collections.deque()
+        self._handle = None
+
+    def _expire(self, now):
+        cutoff = now - self.per
+        while self._sent and self._sent[0] <= cutoff:
+            self._sent.popleft()
+
+    def record(self):
+        self._sent.append(self.loop.time())
+
+    def send_json(self, data):
+        self._queue.append(data)
+        self._drain()
+
+    def _drain(self):
+        self._handle = None
+        now = self.loop.time()
+        self._expire(now)
+
+        while self._queue and len(self._sent) < self.rate - self.reserve:
+            self.connection.send_json(self._queue.popleft())
+
+        if self._queue and self._handle is None:
+            self._handle = self.loop.call_at(self._sent[0] + self.per, self._drain)
+
+    def clear(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._queue.clear()
+
+    @property
+    def queued(self):
+        return len(self._queue)
 
 
 class ShardOpcode(IntEnum):
@@ -390,9 +690,64 @@ class ShardOpcode(IntEnum):
 
 
 class Shard(BaseConnection):
+    # Close codes after which reconnecting can't possibly succeed.
+    FATAL_CLOSE_CODES = frozenset((4004, 4010, 4011, 4012, 4013, 4014))
+    # Close codes that invalidate the session, a fresh IDENTIFY is needed.
+    NON_RESUMABLE_CLOSE_CODES = frozenset((4007, 4009))
+
     def __init__(self, endpoint, pusher, shard_id):
         super().__init__(endpoint, pusher)
         self.id = shard_id
+        self.gateway_endpoint = endpoint
+
+        self.session_id = None
+        self.sequence = None
+        self.resume_endpoint = None
+
+        self.connect_kwargs = {}
+        self.reconnecting = False
+
+        self.capture = None
+        self._owns_capture = False
+
+        self.send_limiter = GatewaySendLimiter(self)
+
+    def send_json(self, data):
+        self.send_limiter.record()
+        super().send_json(data)
+
+    def close(self, code=1000):
+        # Whatever was held back was meant for this connection.
+        self.send_limiter.clear()
+        super().close(code)
+
+    def start_capture(self, capture, *, compress=None):
+        # Accepts a path or a GatewayCapture shared with other shards.
+        self.stop_capture()
+
+        if not isinstance(capture, GatewayCapture):
+            capture = GatewayCapture(capture, compress=compress)
+            self._owns_capture = True
+
+        self.capture = capture
+        return capture
+
+    def stop_capture(self):
+        if self.capture is not None and self._owns_capture:
+            self.capture.close()
+
+        self.capture = None
+        self._owns_capture = False
+
+    def ws_frame_receive(self, frame):
+        if self.capture is not None:
+            self.capture.write(self.id, frame.fbyte, frame.data)
+
+        super().ws_frame_receive(frame)
+
+    @property
+    def resumable(self):
+        return self.session_id is not None and self.sequence is not None
 
     @property
     def identify_payload(self):
@@ -400,7 +755,6 @@ class Shard(BaseConnection):
             'op': ShardOpcode.IDENTIFY,
             'd': {
                 'token': self.pusher.token,
-                # 'intents': self.manager.intents,
                 'properties': {
                     '$os': platform.system(),
                     '$browser': 'wrapper-we-dont-name-for',
@@ -408,28 +762,184 @@ class Shard(BaseConnection):
                 }
             }
         }
+        if self.pusher.intents is not None:
+            payload['d']['intents'] = int(self.pusher.intents)
         if self.pusher.multi_sharded:
-            payload['shard'] = [self.id, len(self.pusher.shards)]
+            payload['d']['shard'] = [self.id, self.pusher.shard_count]
+        return payload
+
+    @property
+    def resume_payload(self):
+        payload = {
+            'op': ShardOpcode.RESUME,
+            'd': {
+                'token': self.pusher.token,
+                'session_id': self.session_id,
+                'seq': self.sequence
+            }
+        }
         return payload
 
     @property
     def heartbeat_payload(self):
         payload = {
             'op': ShardOpcode.HEARTBEAT,
-            'd': None
+            'd': self.sequence
         }
         return payload
 
-    async def ws_receive(self, response):
+    def request_guild_members(
+        self,
+        guild_id,
+        *,
+        query=None,
+        limit=0,
+        presences=False,
+        user_ids=None,
+        nonce=None
+    ):
+        payload = {
+            'op': ShardOpcode.REQUEST_GUILD_MEMBERS,
+            'd': {
+                'guild_id': str(guild_id),
+                'limit': limit,
+                'presences': presences
+            }
+        }
+
+        if user_ids is not None:
+            payload['d']['user_ids'] = [str(user_id) for user_id in user_ids]
+        else:
+            payload['d']['query'] = query or ''
+
+        if nonce is not None:
+            payload['d']['nonce'] = nonce
+
+        self.send_limiter.send_json(payload)
+
+    def invalidate_session(self):
+        self.session_id = None
+        self.sequence = None
+        self.resume_endpoint = None
+
+    async def connect(self, **kwargs):
+        self.connect_kwargs = kwargs.copy()
+        await super().connect(**kwargs)
+
+    async def reconnect(self, *, resume=True, delay=0):
+        if self.reconnecting:
+            return
+
+        self.reconnecting = True
+        try:
+            self.close(4000)
+
+            if not resume:
+                self.invalidate_session()
+
+            if self.resumable and self.resume_endpoint is not None:
+                self.endpoint = self.resume_endpoint
+            else:
+                self.endpoint = self.gateway_endpoint
+
+            attempt = 0
+            while True:
+                await asyncio.sleep(delay)
+                try:
+                    await self.connect(**self.connect_kwargs)
+                except (OSError, BadWsHttpResponse) as e:
+                    CONNECTION_LOGGER.warning(
+                        'Shard %s failed to reconnect: %r', self.id, e
+                    )
+                    delay = min((60, 2 ** attempt))
+                    attempt += 1
+                else:
+                    return
+        finally:
+            self.reconnecting = False
+
+    async def identify(self):
+        scheduler = self.pusher.identify_scheduler
+        if scheduler is not None:
+            await scheduler.acquire(self.id)
+
+        self.send_json(self.identify_payload)
+
+    def resume(self):
+        CONNECTION_LOGGER.info(
+            'Shard %s resuming session %s at sequence %s',
+            self.id, self.session_id, self.sequence
+        )
+        self.send_json(self.resume_payload)
+
+    async def connection_stale(self):
+        await self.reconnect()
+
+    def connection_lost(self, exc):
+        if not self.closing:
+            self.loop.create_task(self.reconnect())
+
+    def ws_close(self, code):
+        if code in self.FATAL_CLOSE_CODES:
+            CONNECTION_LOGGER.error('Shard %s closed with code %s', self.id, code)
+            self.close()
+            return
+
+        resume = code not in self.NON_RESUMABLE_CLOSE_CODES
+        self.loop.create_task(self.reconnect(resume=resume))
+
+    def ws_receive(self, response):
+        # Called for every frame, only the rare control opcodes pay for a
+        # task.
+        if response.sequence is not None:
+            self.sequence = response.sequence
+
         if response.opcode == ShardOpcode.HELLO:
-            self.send_json(self.identify_payload)
+            if self.resumable:
+                self.resume()
+            else:
+                self.loop.create_task(self.identify())
             interval = response.data['heartbeat_interval'] / 1000
             self.heartbeat_handler.heartbeat_interval = interval
             self.heartbeat_handler.start()
         elif response.opcode == ShardOpcode.HEARTBEAT_ACK:
+            if self.heartbeat_handler.ack():
+                self.pusher.client.metrics.observe(
+                    'gateway_latency_seconds', self.heartbeat_handler.latency, shard=self.id
+                )
             self.push_event('heartbeat_ack')
+        elif response.opcode == ShardOpcode.HEARTBEAT:
+            self.send_json(self.heartbeat_payload)
+        elif response.opcode == ShardOpcode.RECONNECT:
+            self.loop.create_task(self.reconnect())
+        elif response.opcode == ShardOpcode.INVALID_SESSION:
+            # Discord asks for a random 1-5 second wait before identifying
+            # again when the session can't be resumed.
+            if response.data:
+                self.loop.create_task(self.reconnect())
+            else:
+                self.loop.create_task(
+                    self.reconnect(resume=False, delay=random.uniform(1, 5))
+                )
         elif response.opcode == ShardOpcode.DISPATCH:
-            self.pusher.push_event(response.event_name, response.data)
+            self.pusher.event_counts[response.event_name] += 1
+
+            if response.event_name == 'READY':
+                self.session_id = response.data['session_id']
+                self.resume_endpoint = response.data.get('resume_gateway_url')
+
+            event_filter = self.pusher.event_filter
+            if event_filter.active and event_filter.drop(response.event_name, response.data):
+                return
+
+            try:
+                self.pusher.push_raw_event(response.event_name, response.data)
+            except Exception:
+                # Handlers and listeners run inline with the socket read, a
+                # broken one must not take the connection down with it.
+                CONNECTION_LOGGER.exception(
+                    'Shard %s failed to dispatch %s', self.id, response.event_name
+                )
 
 
 class VoiceConnectionOpcode(IntEnum):
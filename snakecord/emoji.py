@@ -34,18 +34,19 @@ class GuildEmoji(structures.GuildEmoji):
 
         return dct
 
+    def _update_roles(self):
+        roles = (self.guild.roles.get(role) for role in self._roles or ())
+        self.roles = [role for role in roles if role is not None]
+
     def _update(self, *args, **kwargs):
         super()._update(*args, **kwargs)
-        roles_seen = set()
+        self._update_roles()
 
-        for role in self._roles:
-            role = self.guild.roles.get(role)
-            if role is not None:
-                self.roles.append(role)
+    def _patch(self, data):
+        super()._patch(data)
 
-        for role in self.roles:
-            if role.id not in roles_seen:
-                self.roles.pop(role.id)
+        if 'roles' in data:
+            self._update_roles()
 
 
 class GuildEmojiState(BaseState):
@@ -1,4 +1,4 @@
-from enum import Enum, IntEnum
+from enum import Enum, IntEnum, IntFlag
 
 
 class PermissionFlag(IntEnum):
@@ -93,3 +93,37 @@ class EmbedType(Enum):
     GIFV = 'gifv'
     ARTICLE = 'article'
     LINK = 'link'
+
+
+class Intents(IntFlag):
+    NONE = 0
+    GUILDS = 1 << 0
+    GUILD_MEMBERS = 1 << 1
+    GUILD_BANS = 1 << 2
+    GUILD_EMOJIS = 1 << 3
+    GUILD_INTEGRATIONS = 1 << 4
+    GUILD_WEBHOOKS = 1 << 5
+    GUILD_INVITES = 1 << 6
+    GUILD_VOICE_STATES = 1 << 7
+    GUILD_PRESENCES = 1 << 8
+    GUILD_MESSAGES = 1 << 9
+    GUILD_MESSAGE_REACTIONS = 1 << 10
+    GUILD_MESSAGE_TYPING = 1 << 11
+    DIRECT_MESSAGES = 1 << 12
+    DIRECT_MESSAGE_REACTIONS = 1 << 13
+    DIRECT_MESSAGE_TYPING = 1 << 14
+
+    @classmethod
+    def all(cls):
+        value = cls.NONE
+        for intent in cls:
+            value |= intent
+        return value
+
+    @classmethod
+    def privileged(cls):
+        return cls.GUILD_MEMBERS | cls.GUILD_PRESENCES
+
+    @classmethod
+    def default(cls):
+        return cls.all() & ~cls.privileged()
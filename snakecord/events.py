@@ -1,44 +1,195 @@
 import asyncio
+import collections
+import functools
+import inspect
 import weakref
 
+from enum import Enum
+
+from . import profiling
+from .logger import EVENT_LOGGER
+from .utils import _try_snowflake
+
+
+def _payload(args):
+    return getattr(args[0], 'payload', args[0]) if args else None
+
+
+def channel_key(*args):
+    return int(_payload(args)['channel_id'])
+
+
+def guild_key(*args):
+    return int(_payload(args)['guild_id'])
+
+
+def author_key(*args):
+    return int(_payload(args)['author']['id'])
+
 
 class EventWaiter:
-    def __init__(self, pusher, name, timeout, filter):
+    def __init__(self, pusher, name, timeout, filter, key=None, value=None):
         self.pusher = pusher
+        self.loop = pusher.loop
         self.name = name
         self.timeout = timeout
         self.filter = filter
-        self._queue = asyncio.Queue()
+        self.key = key
+        self.value = _try_snowflake(value)
+
+        self._future = self.loop.create_future()
+        self._queue = None
+        self.closed = False
 
-    async def _do_wait(self):
-        coro = self._queue.get()
-        ret = await asyncio.wait_for(coro, timeout=self.timeout)
-        if len(ret) == 1:
-            return ret[0]
-        return ret
+    @staticmethod
+    def _unpack(args):
+        if len(args) == 1:
+            return args[0]
+        return args
+
+    def _feed(self, args):
+        if self.filter is not None and not self.filter(*args):
+            return
+
+        if self._future is not None and not self._future.done():
+            self._future.set_result(args)
+
+            if self._queue is None:
+                # Awaited waiters only ever see one event.
+                self.close()
+        elif self._queue is not None:
+            self._queue.append(args)
 
     def __aiter__(self):
+        if self._queue is None:
+            self._queue = collections.deque()
+
+            if self._future.done() and not self._future.cancelled():
+                self._queue.append(self._future.result())
+                self._future = None
+
+            if self.closed:
+                self.closed = False
+                self.pusher._add_waiter(self)
+
         return self
 
-    __anext__ = _do_wait
+    async def __anext__(self):
+        if self._queue:
+            return self._unpack(self._queue.popleft())
 
-    async def __await__impl(self):
+        if self.closed:
+            raise StopAsyncIteration
+
+        self._future = self.loop.create_future()
         try:
-            ret = await self._do_wait()
+            args = await asyncio.wait_for(self._future, timeout=self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self.close()
+            raise
+
+        return self._unpack(args)
+
+    async def _wait(self):
+        try:
+            args = await asyncio.wait_for(self._future, timeout=self.timeout)
         finally:
-            self._cleanup()
-        return ret
+            self.close()
+        return self._unpack(args)
 
     def __await__(self):
-        return self.__await__impl().__await__()
+        return self._wait().__await__()
 
-    def _cleanup(self):
-        try:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
             self.pusher.remove_waiter(self)
-        except KeyError:
-            pass
 
-    __del__ = _cleanup
+
+class WaiterIndex:
+    # Waiters for one event name. Keyed waiters are bucketed by the value
+    # their key function has to return, so an event only looks at the
+    # waiters that can match it instead of every waiter's filter.
+    # Waiters are only held weakly, one that is never awaited or iterated
+    # drops out of the index once nothing else references it.
+    def __init__(self):
+        self.unkeyed = weakref.WeakKeyDictionary()
+        self.keyed = {}
+
+    def __len__(self):
+        return len(self.unkeyed) + sum(
+            len(waiters) for values in self.keyed.values() for waiters in values.values()
+        )
+
+    def add(self, waiter):
+        if waiter.key is None:
+            self.unkeyed[waiter] = None
+            return
+
+        values = self.keyed.get(waiter.key)
+        if values is None:
+            values = self.keyed[waiter.key] = {}
+
+        waiters = values.get(waiter.value)
+        if waiters is None:
+            waiters = values[waiter.value] = weakref.WeakKeyDictionary()
+
+        waiters[waiter] = None
+
+    def remove(self, waiter):
+        if waiter.key is None:
+            self.unkeyed.pop(waiter, None)
+            return
+
+        values = self.keyed.get(waiter.key)
+        if values is None:
+            return
+
+        waiters = values.get(waiter.value)
+        if waiters is None:
+            return
+
+        waiters.pop(waiter, None)
+        if not waiters:
+            del values[waiter.value]
+            if not values:
+                del self.keyed[waiter.key]
+
+    def __call__(self, *args):
+        if self.keyed:
+            for key, values in list(self.keyed.items()):
+                try:
+                    value = key(*args)
+                except (KeyError, IndexError, TypeError, ValueError, AttributeError):
+                    continue
+
+                # Payload ids are strings, waiters may have been given ints.
+                if value.__class__ is not int:
+                    value = _try_snowflake(value)
+
+                waiters = values.get(value)
+                if waiters is None:
+                    continue
+
+                if not waiters:
+                    # Everything in the bucket was collected.
+                    del values[value]
+                    if not values:
+                        del self.keyed[key]
+                    continue
+
+                for waiter in list(waiters):
+                    waiter._feed(args)
+
+        if self.unkeyed:
+            for waiter in list(self.unkeyed):
+                waiter._feed(args)
 
 
 def run_coroutine(coro, loop):
@@ -46,6 +197,162 @@ def run_coroutine(coro, loop):
         loop.create_task(coro)
 
 
+class OverflowPolicy(Enum):
+    DROP_OLDEST = 'drop_oldest'
+    DROP_NEW = 'drop_new'
+    BLOCK = 'block'
+
+
+class DispatchQueue:
+    def __init__(self, pusher, name, *, workers=1, maxsize=1000, overflow=OverflowPolicy.BLOCK):
+        self.pusher = pusher
+        self.loop = pusher.loop
+        self.name = name
+        self.workers = workers
+        self.maxsize = maxsize
+        self.overflow = OverflowPolicy(overflow)
+        # Reading resumes once the backlog is down to half the queue.
+        self.low_water = maxsize // 2
+
+        self._items = collections.deque()
+        self._idle = collections.deque()
+        self._tasks = []
+
+        self.paused = False
+        self.high_water = 0
+        self.dropped = 0
+        self.processed = 0
+
+    @property
+    def depth(self):
+        return len(self._items)
+
+    def put(self, func, *args):
+        if len(self._items) >= self.maxsize:
+            if self.overflow is OverflowPolicy.DROP_NEW:
+                self.dropped += 1
+                return
+
+            if self.overflow is OverflowPolicy.DROP_OLDEST:
+                self._items.popleft()
+                self.dropped += 1
+            elif not self.paused:
+                # The events already read still have to go somewhere, stop
+                # reading more so TCP pushes back on the gateway instead.
+                self.paused = True
+                self.pusher.pause_reading()
+
+        self._items.append((func, args))
+        self.high_water = max((self.high_water, len(self._items)))
+
+        while self._idle:
+            fut = self._idle.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+
+        if len(self._tasks) < self.workers:
+            self._tasks.append(self.loop.create_task(self._work()))
+
+    async def _work(self):
+        while True:
+            if not self._items:
+                fut = self.loop.create_future()
+                self._idle.append(fut)
+                await fut
+                continue
+
+            func, args = self._items.popleft()
+
+            if self.paused and len(self._items) <= self.low_water:
+                self.paused = False
+                self.pusher.resume_reading()
+
+            try:
+                await func(*args)
+            except Exception:
+                EVENT_LOGGER.exception('Listener %r for %s failed', func, self.name)
+
+            self.processed += 1
+
+    def close(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+
+        if self.paused:
+            self.paused = False
+            self.pusher.resume_reading()
+
+    def stats(self):
+        return {
+            'depth': len(self._items),
+            'maxsize': self.maxsize,
+            'high_water': self.high_water,
+            'dropped': self.dropped,
+            'processed': self.processed,
+            'workers': len(self._tasks),
+            'paused': self.paused
+        }
+
+    def __repr__(self):
+        return '<DispatchQueue name={0.name!r} depth={0.depth} dropped={0.dropped}>'.format(self)
+
+
+def partition_key(*args):
+    if not args:
+        return None
+
+    payload = getattr(args[0], 'payload', args[0])
+    if isinstance(payload, dict):
+        return payload.get('channel_id') or payload.get('guild_id')
+
+
+class PartitionedDispatcher:
+    def __init__(self, pusher, *, key=None):
+        self.pusher = pusher
+        self.loop = pusher.loop
+        self.key = key or partition_key
+
+        self._partitions = {}
+        self.processed = 0
+
+    def put(self, func, *args):
+        key = self.key(*args)
+        items = self._partitions.get(key)
+
+        if items is not None:
+            items.append((func, args))
+            return
+
+        # Only an idle key costs a task, a busy one is drained by the
+        # task that is already running for it.
+        items = collections.deque(((func, args),))
+        self._partitions[key] = items
+        self.loop.create_task(self._drain(key, items))
+
+    async def _drain(self, key, items):
+        try:
+            while items:
+                func, args = items.popleft()
+
+                try:
+                    await func(*args)
+                except Exception:
+                    EVENT_LOGGER.exception('Listener %r failed for partition %r', func, key)
+
+                self.processed += 1
+        finally:
+            del self._partitions[key]
+
+    def stats(self):
+        return {
+            'partitions': len(self._partitions),
+            'depth': sum(len(items) for items in self._partitions.values()),
+            'processed': self.processed
+        }
+
+
 class EventPusher:
     handlers = ()
 
@@ -55,6 +362,169 @@ class EventPusher:
         self._listeners = {}
         self._waiters = {}
         self._subscribers = []
+        self._publishers = []
+        # event name (as pushed) -> (handler, callbacks), built lazily and
+        # thrown away whenever a listener, waiter or subscriber changes.
+        self._dispatch = {}
+        self._queue_config = {}
+        self._queues = {}
+        self._ordered = {}
+        self._pause_count = 0
+
+    def _invalidate(self):
+        self._dispatch.clear()
+
+        for publisher in self._publishers:
+            publisher._invalidate()
+
+    def _get_queue(self, name):
+        queue = self._queues.get(name)
+        if queue is not None:
+            return queue
+
+        config = self._queue_config.get(name)
+        if config is None:
+            config = self._queue_config.get(None)
+            if config is None:
+                return None
+
+        queue = DispatchQueue(self, name, **config)
+        self._queues[name] = queue
+        return queue
+
+    def _compile_listener(self, name, func):
+        # Decide once how a listener has to be called instead of checking
+        # its return value on every event.
+        if asyncio.iscoroutinefunction(func):
+            dispatcher = self._ordered.get(name) or self._ordered.get(None)
+            if dispatcher is not None:
+                return functools.partial(dispatcher.put, func)
+
+            queue = self._get_queue(name)
+            if queue is not None:
+                return functools.partial(queue.put, func)
+
+            loop = self.loop
+
+            def call(*args):
+                loop.create_task(func(*args))
+            return call
+
+        loop = self.loop
+
+        def call(*args):
+            # Plain callables may still hand back a coroutine, from a sync
+            # wrapper around an async function for example.
+            result = func(*args)
+            if result is not None and inspect.isawaitable(result):
+                asyncio.ensure_future(result, loop=loop)
+        return call
+
+    def _compile_callbacks(self, name):
+        callbacks = []
+
+        listeners = self._listeners.get(name)
+        if listeners is not None:
+            callbacks.extend(self._compile_listener(name, listener) for listener in listeners)
+
+        waiters = self._waiters.get(name)
+        if waiters is not None:
+            callbacks.append(waiters)
+
+        for subscriber in self._subscribers:
+            callbacks.extend(subscriber._compile_callbacks(name))
+
+        return callbacks
+
+    def _compile(self, name):
+        normalized = name.lower()
+        entry = (self._handlers.get(normalized), tuple(self._compile_callbacks(normalized)))
+
+        self._dispatch[name] = entry
+        return entry
+
+    def set_dispatch_queue(
+        self,
+        name=None,
+        *,
+        workers=1,
+        maxsize=1000,
+        overflow=OverflowPolicy.BLOCK
+    ):
+        # Coroutine listeners for `name` (every event when None) run on a
+        # fixed pool of workers fed by a bounded queue instead of a task
+        # per call. Each event type still gets a queue of its own.
+        if name is not None:
+            name = name.lower()
+
+        self.remove_dispatch_queue(name)
+        self._queue_config[name] = dict(
+            workers=workers, maxsize=maxsize, overflow=OverflowPolicy(overflow)
+        )
+        self._invalidate()
+
+    def remove_dispatch_queue(self, name=None):
+        if name is not None:
+            name = name.lower()
+
+        self._queue_config.pop(name, None)
+
+        for queue_name in list(self._queues):
+            if queue_name == name or name is None and queue_name not in self._queue_config:
+                self._queues.pop(queue_name).close()
+
+        self._invalidate()
+
+    def set_ordered_dispatch(self, *names, key=None):
+        # Coroutine listeners for `names` (every event when empty) run one
+        # at a time per key, channel_id or guild_id by default, so events
+        # for the same channel are handled in the order they arrived.
+        # Events sharing a dispatcher share their ordering.
+        dispatcher = PartitionedDispatcher(self, key=key)
+
+        for name in names or (None,):
+            if name is not None:
+                name = name.lower()
+            self._ordered[name] = dispatcher
+
+        self._invalidate()
+        return dispatcher
+
+    def remove_ordered_dispatch(self, *names):
+        for name in names or (None,):
+            if name is not None:
+                name = name.lower()
+            self._ordered.pop(name, None)
+
+        self._invalidate()
+
+    def queue_stats(self):
+        stats = {name: queue.stats() for name, queue in self._queues.items()}
+
+        for name, dispatcher in self._ordered.items():
+            stats[name] = dispatcher.stats()
+
+        return stats
+
+    def _set_reading(self, reading):
+        for publisher in self._publishers:
+            if reading:
+                publisher.resume_reading()
+            else:
+                publisher.pause_reading()
+
+    def pause_reading(self):
+        self._pause_count += 1
+        if self._pause_count == 1:
+            self._set_reading(False)
+
+    def resume_reading(self):
+        if self._pause_count == 0:
+            return
+
+        self._pause_count -= 1
+        if self._pause_count == 0:
+            self._set_reading(True)
 
     def register_listener(self, name, func):
         name = name.lower()
@@ -65,6 +535,7 @@ class EventPusher:
             self._listeners[name] = listeners
 
         listeners.append(func)
+        self._invalidate()
 
     def remove_listener(self, name, func):
         name = name.lower()
@@ -74,17 +545,24 @@ class EventPusher:
             return
 
         listeners.remove(func)
+        self._invalidate()
 
-    def register_waiter(self, name, *, timeout=None, filter=None):
-        name = name.lower()
-        waiters = self._waiters.get(name)
+    def _add_waiter(self, waiter):
+        waiters = self._waiters.get(waiter.name)
 
         if waiters is None:
-            waiters = weakref.WeakSet()
-            self._waiters[name] = waiters
+            waiters = WaiterIndex()
+            self._waiters[waiter.name] = waiters
+            self._invalidate()
 
-        waiter = EventWaiter(self, name, timeout, filter)
         waiters.add(waiter)
+
+    def register_waiter(self, name, *, timeout=None, filter=None, key=None, value=None):
+        # key is a function returning the value to match from the event's
+        # arguments (see channel_key, guild_key and author_key), waiters
+        # with a key are only checked against events carrying their value.
+        waiter = EventWaiter(self, name.lower(), timeout, filter, key, value)
+        self._add_waiter(waiter)
         return waiter
 
     wait = register_waiter
@@ -98,35 +576,48 @@ class EventPusher:
         waiters.remove(waiter)
 
     def push_event(self, name, *args, **kwargs):
-        name = name.lower()
-        handler = self._handlers.get(name)
+        entry = self._dispatch.get(name)
+        if entry is None:
+            entry = self._compile(name)
 
-        if handler is not None:
-            listener_args = (handler._execute(self, *args, **kwargs),)
-        else:
-            listener_args = args
+        handler, callbacks = entry
 
-        self.call_listeners(name, *listener_args)
+        profiler = profiling.profiler
+        if profiler is not None:
+            return self._push_event_profiled(profiler, name, handler, callbacks, args, kwargs)
 
-        for subscriber in self._subscribers:
-            subscriber.call_listeners(name, *listener_args)
+        if handler is not None:
+            args = (handler._execute(self, *args, **kwargs),)
 
-    def call_listeners(self, name, *args):
-        name = name.lower()
-        listeners = self._listeners.get(name)
-        waiters = self._waiters.get(name)
+        for callback in callbacks:
+            callback(*args)
 
-        if listeners is not None:
-            for listener in listeners:
-                run_coroutine(listener(*args), self.loop)
+    def _push_event_profiled(self, profiler, name, handler, callbacks, args, kwargs):
+        start = profiler.enter()
+        try:
+            if handler is not None:
+                execute_start = profiler.enter()
+                try:
+                    args = (handler._execute(self, *args, **kwargs),)
+                finally:
+                    profiler.exit('handler.' + name, execute_start)
+
+            listeners_start = profiler.enter()
+            try:
+                for callback in callbacks:
+                    callback(*args)
+            finally:
+                profiler.exit('listeners.' + name, listeners_start, listeners=len(callbacks))
+        finally:
+            profiler.exit('push_event.' + name, start)
 
-        if waiters is not None:
-            for waiter in waiters:
-                if waiter.filter is not None:
-                    if not waiter.filter(*args):
-                        continue
+    def call_listeners(self, name, *args):
+        entry = self._dispatch.get(name)
+        if entry is None:
+            entry = self._compile(name)
 
-                waiter._queue.put_nowait(args)
+        for callback in entry[1]:
+            callback(*args)
 
     def on(self, name=None):
         def wrapped(func):
@@ -153,12 +644,18 @@ class EventPusher:
 
     def subscribe(self, pusher):
         pusher._subscribers.append(self)
+        self._publishers.append(pusher)
+        pusher._invalidate()
 
     def unsubscribe(self, pusher):
         pusher._subscribers.remove(self)
+        self._publishers.remove(pusher)
 
         for name in pusher._listeners:
             self._listeners.pop(name, None)
 
         for name in pusher._waiters:
             self._waiters.pop(name, None)
+
+        self._invalidate()
+        pusher._invalidate()
@@ -1,5 +1,26 @@
+import asyncio
+
+
 class BadWsHttpResponse(Exception):
     def __init__(self, tp, expected, got):
         super().__init__(
             "Expected {} {}, got {}".format(tp, expected, got)
         )
+
+
+class HTTPError(Exception):
+    def __init__(self, method, url, status, message):
+        self.method = method
+        self.url = url
+        self.status = status
+        super().__init__(
+            "{} {} failed with status {}: {}".format(method, url, status, message)
+        )
+
+
+class RequestDeadlineExceeded(asyncio.TimeoutError):
+    def __init__(self, deadline):
+        self.deadline = deadline
+        super().__init__(
+            "Request could not be sent before its deadline"
+        )
@@ -0,0 +1,80 @@
+import asyncio
+import io
+import os
+
+CHUNK_SIZE = 64 * 1024
+
+
+class File:
+    def __init__(self, fp, filename=None, *, spoiler=False, content_type=None):
+        self.fp = fp
+        self.content_type = content_type
+        # Handles opened from a path, aiohttp only closes the ones it
+        # gets to stream.
+        self._handles = []
+
+        if isinstance(fp, (str, os.PathLike)):
+            self._position = None
+            default = os.path.basename(os.fspath(fp))
+        elif isinstance(fp, io.IOBase):
+            self._position = fp.tell()
+            default = os.path.basename(getattr(fp, 'name', '') or '')
+        elif callable(fp) or hasattr(fp, '__aiter__'):
+            self._position = None
+            default = None
+        else:
+            raise TypeError(
+                'Expected a path, a binary file object or an async iterable, '
+                'got {!r}'.format(type(fp).__name__)
+            )
+
+        filename = filename or default or 'untitled'
+
+        if spoiler and not filename.startswith('SPOILER_'):
+            filename = 'SPOILER_' + filename
+
+        self.filename = filename
+
+    @property
+    def replayable(self):
+        # An async iterator can only be consumed once, everything else can
+        # be rewound or reopened when the request has to be sent again.
+        return not hasattr(self.fp, '__aiter__')
+
+    async def _iter_file(self, loop):
+        while True:
+            chunk = await loop.run_in_executor(None, self.fp.read, CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+    def open(self, loop=None):
+        if isinstance(self.fp, (str, os.PathLike)):
+            handle = open(self.fp, 'rb')
+            self._handles.append(handle)
+            return handle
+
+        if self._position is not None:
+            self.fp.seek(self._position)
+            return self._iter_file(loop or asyncio.get_event_loop())
+
+        if callable(self.fp):
+            return self.fp()
+
+        return self.fp
+
+    def close(self):
+        # Only closes what open() opened, file objects passed in are left
+        # to whoever passed them.
+        for handle in self._handles:
+            handle.close()
+        self._handles.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return '<File filename={0.filename!r}>'.format(self)
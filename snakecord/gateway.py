@@ -1,5 +1,49 @@
+import asyncio
+import collections
+import random
+import types
+
+from .capture import GatewayCapture
 from .connection import Shard
+from .enums import Intents
 from .events import EventPusher
+from .message import Message, MessageState
+
+EVENT_INTENTS = {
+    'guild_create': Intents.GUILDS,
+    'guild_update': Intents.GUILDS,
+    'guild_delete': Intents.GUILDS,
+    'guild_role_create': Intents.GUILDS,
+    'guild_role_update': Intents.GUILDS,
+    'guild_role_delete': Intents.GUILDS,
+    'channel_create': Intents.GUILDS,
+    'channel_update': Intents.GUILDS,
+    'channel_delete': Intents.GUILDS,
+    'channel_pins_update': Intents.GUILDS | Intents.DIRECT_MESSAGES,
+    'guild_member_add': Intents.GUILD_MEMBERS,
+    'guild_member_update': Intents.GUILD_MEMBERS,
+    'guild_member_remove': Intents.GUILD_MEMBERS,
+    'guild_ban_add': Intents.GUILD_BANS,
+    'guild_ban_remove': Intents.GUILD_BANS,
+    'guild_emojis_update': Intents.GUILD_EMOJIS,
+    'guild_integrations_update': Intents.GUILD_INTEGRATIONS,
+    'webhooks_update': Intents.GUILD_WEBHOOKS,
+    'invite_create': Intents.GUILD_INVITES,
+    'invite_delete': Intents.GUILD_INVITES,
+    'voice_state_update': Intents.GUILD_VOICE_STATES,
+    'presence_update': Intents.GUILD_PRESENCES,
+    'message_create': Intents.GUILD_MESSAGES | Intents.DIRECT_MESSAGES,
+    'message_update': Intents.GUILD_MESSAGES | Intents.DIRECT_MESSAGES,
+    'message_delete': Intents.GUILD_MESSAGES | Intents.DIRECT_MESSAGES,
+    'message_delete_bulk': Intents.GUILD_MESSAGES,
+    'message_reaction_add': Intents.GUILD_MESSAGE_REACTIONS | Intents.DIRECT_MESSAGE_REACTIONS,
+    'message_reaction_remove': Intents.GUILD_MESSAGE_REACTIONS | Intents.DIRECT_MESSAGE_REACTIONS,
+    'message_reaction_remove_all':
+        Intents.GUILD_MESSAGE_REACTIONS | Intents.DIRECT_MESSAGE_REACTIONS,
+    'message_reaction_remove_emoji':
+        Intents.GUILD_MESSAGE_REACTIONS | Intents.DIRECT_MESSAGE_REACTIONS,
+    'typing_start': Intents.GUILD_MESSAGE_TYPING | Intents.DIRECT_MESSAGE_TYPING,
+}
 
 
 class BaseGatewayEvent:
@@ -8,6 +52,16 @@ class BaseGatewayEvent:
         self.payload = payload
 
 
+class ReadyHandler(BaseGatewayEvent):
+    name = 'ready'
+
+    @classmethod
+    def _execute(cls, sharder, payload):
+        sharder.client.user = sharder.client.users._add(payload['user'])
+        # 'ready' listeners have always been given the raw payload.
+        return payload
+
+
 class ChannelCreateHandler(BaseGatewayEvent):
     name = 'channel_create'
 
@@ -17,9 +71,16 @@ class ChannelCreateHandler(BaseGatewayEvent):
 
     @classmethod
     def _execute(cls, sharder, payload):
-        channel = sharder.client.channels._add(payload)
+        channel = cls._get_state(sharder, payload)._add(payload)
         return cls(sharder, payload, channel)
 
+    @staticmethod
+    def _get_state(sharder, payload):
+        guild = sharder.client.guilds.get(payload.get('guild_id'))
+        if guild is not None:
+            return guild.channels
+        return sharder.client.channels
+
 
 class ChannelUpdateHandler(BaseGatewayEvent):
     name = 'channel_update'
@@ -30,7 +91,7 @@ class ChannelUpdateHandler(BaseGatewayEvent):
 
     @classmethod
     def _execute(cls, sharder, payload):
-        channel = sharder.client.channels._add(payload)
+        channel = ChannelCreateHandler._get_state(sharder, payload)._add(payload)
         return cls(sharder, payload, channel)
 
 
@@ -43,7 +104,7 @@ class ChannelDeleteHandler(BaseGatewayEvent):
 
     @classmethod
     def _execute(cls, sharder, payload):
-        channel = sharder.client.channels.pop(payload['id'])
+        channel = ChannelCreateHandler._get_state(sharder, payload).pop(payload['id'])
         return cls(sharder, payload, channel)
 
 
@@ -83,7 +144,11 @@ class GuildUpdateHandler(BaseGatewayEvent):
 
     @classmethod
     def _execute(cls, sharder, payload):
-        guild = sharder.client.guilds._add(payload)
+        guild = sharder.client.guilds.get(payload['id'])
+        if guild is not None:
+            guild._patch(payload)
+        else:
+            guild = sharder.client.guilds._add(payload)
         return cls(sharder, payload, guild)
 
 
@@ -110,37 +175,735 @@ class MessageCreateHandler(BaseGatewayEvent):
     @classmethod
     def _execute(cls, sharder, payload):
         channel = sharder.client.channels.get(payload['channel_id'])
-        message = channel.messages._add(payload)
+        if channel is not None:
+            message = channel.messages._add(payload)
+        else:
+            # Nothing to cache the message in, e.g. a DM channel that was
+            # never fetched.
+            state = MessageState(sharder.client, None)
+            message = Message.unmarshal(payload, state=state, channel=None)
+        return cls(sharder, payload, message)
+
+
+class MessageUpdateHandler(BaseGatewayEvent):
+    name = 'message_update'
+
+    def __init__(self, sharder, payload, message):
+        super().__init__(sharder, payload)
+        self.message = message
+
+    @classmethod
+    def _execute(cls, sharder, payload):
+        # Updates are partial, an uncached message can't be rebuilt from one.
+        channel = sharder.client.channels.get(payload['channel_id'])
+        message = None
+        if channel is not None:
+            message = channel.messages.get(payload['id'])
+            if message is not None:
+                message._patch(payload)
         return cls(sharder, payload, message)
 
 
+class MessageDeleteHandler(BaseGatewayEvent):
+    name = 'message_delete'
+
+    def __init__(self, sharder, payload, message):
+        super().__init__(sharder, payload)
+        self.message = message
+
+    @classmethod
+    def _execute(cls, sharder, payload):
+        channel = sharder.client.channels.get(payload['channel_id'])
+        message = None
+        if channel is not None:
+            message = channel.messages.pop(payload['id'], None)
+        return cls(sharder, payload, message)
+
+
+class MessageDeleteBulkHandler(BaseGatewayEvent):
+    name = 'message_delete_bulk'
+
+    def __init__(self, sharder, payload, messages):
+        super().__init__(sharder, payload)
+        self.messages = messages
+
+    @classmethod
+    def _execute(cls, sharder, payload):
+        channel = sharder.client.channels.get(payload['channel_id'])
+        messages = []
+        if channel is not None:
+            for message_id in payload['ids']:
+                message = channel.messages.pop(message_id, None)
+                if message is not None:
+                    messages.append(message)
+        return cls(sharder, payload, messages)
+
+
+class BaseReactionEvent(BaseGatewayEvent):
+    def __init__(self, sharder, payload, message, reaction):
+        super().__init__(sharder, payload)
+        self.message = message
+        self.reaction = reaction
+        self.emoji = payload.get('emoji')
+        self.user_id = payload.get('user_id')
+
+    @staticmethod
+    def _get_message(sharder, payload):
+        channel = sharder.client.channels.get(payload['channel_id'])
+        if channel is not None:
+            return channel.messages.get(payload['message_id'])
+
+    @staticmethod
+    def _is_me(sharder, payload):
+        user = sharder.client.user
+        return user is not None and int(payload['user_id']) == user.id
+
+
+class MessageReactionAddHandler(BaseReactionEvent):
+    name = 'message_reaction_add'
+
+    @classmethod
+    def _execute(cls, sharder, payload):
+        message = cls._get_message(sharder, payload)
+        reaction = None
+        if message is not None:
+            me = cls._is_me(sharder, payload)
+            reaction = message.reactions.get(payload['emoji'])
+            if reaction is not None:
+                reaction.count += 1
+                reaction.me = reaction.me or me
+            else:
+                reaction = message.reactions._add(
+                    {'emoji': payload['emoji'], 'count': 1, 'me': me}
+                )
+        return cls(sharder, payload, message, reaction)
+
+
+class MessageReactionRemoveHandler(BaseReactionEvent):
+    name = 'message_reaction_remove'
+
+    @classmethod
+    def _execute(cls, sharder, payload):
+        message = cls._get_message(sharder, payload)
+        reaction = None
+        if message is not None:
+            reaction = message.reactions.get(payload['emoji'])
+            if reaction is not None:
+                reaction.count -= 1
+                if cls._is_me(sharder, payload):
+                    reaction.me = False
+                if reaction.count <= 0:
+                    message.reactions.pop(payload['emoji'], None)
+        return cls(sharder, payload, message, reaction)
+
+
+class MessageReactionRemoveAllHandler(BaseReactionEvent):
+    name = 'message_reaction_remove_all'
+
+    @classmethod
+    def _execute(cls, sharder, payload):
+        message = cls._get_message(sharder, payload)
+        if message is not None:
+            message.reactions.clear()
+        return cls(sharder, payload, message, None)
+
+
+class MessageReactionRemoveEmojiHandler(BaseReactionEvent):
+    name = 'message_reaction_remove_emoji'
+
+    @classmethod
+    def _execute(cls, sharder, payload):
+        message = cls._get_message(sharder, payload)
+        reaction = None
+        if message is not None:
+            reaction = message.reactions.pop(payload['emoji'], None)
+        return cls(sharder, payload, message, reaction)
+
+
+class GuildMemberAddHandler(BaseGatewayEvent):
+    name = 'guild_member_add'
+
+    def __init__(self, sharder, payload, guild, member):
+        super().__init__(sharder, payload)
+        self.guild = guild
+        self.member = member
+
+    @classmethod
+    def _execute(cls, sharder, payload):
+        guild = sharder.client.guilds.get(payload['guild_id'])
+        member = None
+        if guild is not None:
+            member = guild.members._add(payload)
+            if guild.member_count is not None:
+                guild.member_count += 1
+        return cls(sharder, payload, guild, member)
+
+
+class GuildMemberUpdateHandler(BaseGatewayEvent):
+    name = 'guild_member_update'
+
+    def __init__(self, sharder, payload, guild, member):
+        super().__init__(sharder, payload)
+        self.guild = guild
+        self.member = member
+
+    @classmethod
+    def _execute(cls, sharder, payload):
+        guild = sharder.client.guilds.get(payload['guild_id'])
+        member = None
+        if guild is not None:
+            member = guild.members.get(payload['user']['id'], prefetch=False)
+            if member is not None:
+                member._patch(payload)
+            else:
+                member = guild.members._add(payload)
+        return cls(sharder, payload, guild, member)
+
+
+class GuildMemberRemoveHandler(BaseGatewayEvent):
+    name = 'guild_member_remove'
+
+    def __init__(self, sharder, payload, guild, member):
+        super().__init__(sharder, payload)
+        self.guild = guild
+        self.member = member
+
+    @classmethod
+    def _execute(cls, sharder, payload):
+        guild = sharder.client.guilds.get(payload['guild_id'])
+        member = None
+        if guild is not None:
+            member = guild.members.pop(payload['user']['id'], None)
+            if guild.member_count:
+                guild.member_count -= 1
+        return cls(sharder, payload, guild, member)
+
+
+class GuildMembersChunkHandler(BaseGatewayEvent):
+    name = 'guild_members_chunk'
+
+    def __init__(self, sharder, payload, guild, members, request):
+        super().__init__(sharder, payload)
+        self.guild = guild
+        self.members = members
+        self.request = request
+
+    @classmethod
+    def _execute(cls, sharder, payload):
+        guild = sharder.client.guilds.get(payload['guild_id'])
+        request = sharder._chunk_requests.get(payload.get('nonce'))
+        members = []
+
+        if guild is not None:
+            if request is None or request.cache:
+                create = guild.members._add
+            else:
+                create = guild.members._create
+
+            members = [create(member) for member in payload['members']]
+
+            presences = payload.get('presences')
+            if presences:
+                by_id = {member.user.id: member for member in members}
+                for presence in presences:
+                    member = by_id.get(int(presence['user']['id']))
+                    if member is not None:
+                        member._patch_presence(presence)
+
+        if request is not None:
+            request._feed(members, payload)
+        return cls(sharder, payload, guild, members, request)
+
+
+class GuildRoleCreateHandler(BaseGatewayEvent):
+    name = 'guild_role_create'
+
+    def __init__(self, sharder, payload, guild, role):
+        super().__init__(sharder, payload)
+        self.guild = guild
+        self.role = role
+
+    @classmethod
+    def _execute(cls, sharder, payload):
+        guild = sharder.client.guilds.get(payload['guild_id'])
+        role = None
+        if guild is not None:
+            role = guild.roles._add(payload['role'])
+        return cls(sharder, payload, guild, role)
+
+
+class GuildRoleUpdateHandler(BaseGatewayEvent):
+    name = 'guild_role_update'
+
+    def __init__(self, sharder, payload, guild, role):
+        super().__init__(sharder, payload)
+        self.guild = guild
+        self.role = role
+
+    @classmethod
+    def _execute(cls, sharder, payload):
+        guild = sharder.client.guilds.get(payload['guild_id'])
+        role = None
+        if guild is not None:
+            role = guild.roles.get(payload['role']['id'])
+            if role is not None:
+                role._patch(payload['role'])
+            else:
+                role = guild.roles._add(payload['role'])
+        return cls(sharder, payload, guild, role)
+
+
+class GuildRoleDeleteHandler(BaseGatewayEvent):
+    name = 'guild_role_delete'
+
+    def __init__(self, sharder, payload, guild, role):
+        super().__init__(sharder, payload)
+        self.guild = guild
+        self.role = role
+
+    @classmethod
+    def _execute(cls, sharder, payload):
+        guild = sharder.client.guilds.get(payload['guild_id'])
+        role = None
+        if guild is not None:
+            role = guild.roles.pop(payload['role_id'], None)
+            if role is not None:
+                for member in guild.members._items.values():
+                    member.roles._items.pop(role.id, None)
+        return cls(sharder, payload, guild, role)
+
+
+class GuildEmojisUpdateHandler(BaseGatewayEvent):
+    name = 'guild_emojis_update'
+
+    def __init__(self, sharder, payload, guild, emojis):
+        super().__init__(sharder, payload)
+        self.guild = guild
+        self.emojis = emojis
+
+    @classmethod
+    def _execute(cls, sharder, payload):
+        guild = sharder.client.guilds.get(payload['guild_id'])
+        emojis = []
+        if guild is not None:
+            for data in payload['emojis']:
+                emoji = guild.emojis.get(data['id'])
+                if emoji is not None:
+                    emoji._patch(data)
+                else:
+                    emoji = guild.emojis._add(data)
+                emojis.append(emoji)
+
+            seen = {emoji.id for emoji in emojis}
+            for emoji_id in guild.emojis._items.keys() - seen:
+                del guild.emojis._items[emoji_id]
+        return cls(sharder, payload, guild, emojis)
+
+
+class PresenceUpdateHandler(BaseGatewayEvent):
+    name = 'presence_update'
+
+    def __init__(self, sharder, payload, guild, member):
+        super().__init__(sharder, payload)
+        self.guild = guild
+        self.member = member
+
+    @classmethod
+    def _execute(cls, sharder, payload):
+        user = payload['user']
+        guild = sharder.client.guilds.get(payload.get('guild_id'))
+        member = None
+
+        if len(user) > 1:
+            # Only changed user fields are sent, usually none but the id.
+            cached = sharder.client.users.get(user['id'])
+            if cached is not None:
+                cached._patch(user)
+
+        if guild is not None:
+            member = guild.members.get(user['id'], prefetch=False)
+            if member is not None:
+                member._patch_presence(payload)
+        return cls(sharder, payload, guild, member)
+
+
+class VoiceStateUpdateHandler(BaseGatewayEvent):
+    name = 'voice_state_update'
+
+    def __init__(self, sharder, payload, guild, voice_state):
+        super().__init__(sharder, payload)
+        self.guild = guild
+        self.voice_state = voice_state
+
+    @classmethod
+    def _execute(cls, sharder, payload):
+        guild = sharder.client.guilds.get(payload.get('guild_id'))
+        voice_state = None
+        if guild is not None:
+            if payload['channel_id'] is None:
+                voice_state = guild.voice_states.pop(payload['user_id'], None)
+                if voice_state is not None:
+                    voice_state._patch(payload)
+            else:
+                voice_state = guild.voice_states._add(payload)
+        return cls(sharder, payload, guild, voice_state)
+
+
+class EventFilter:
+    # Drops DISPATCH payloads before any handler builds objects out of
+    # them. Only the raw event name and a few top level ids are looked at.
+    def __init__(self):
+        self.events = set()
+        self.guild_ids = set()
+        self.channel_ids = set()
+        self.author_ids = set()
+        self.sample_rates = {}
+        self.predicates = []
+
+        self.active = False
+        self.dropped = 0
+
+    @staticmethod
+    def _ids(ids):
+        return {str(getattr(id, 'id', id)) for id in ids}
+
+    def _update(self):
+        self.active = bool(
+            self.events or self.guild_ids or self.channel_ids or
+            self.author_ids or self.sample_rates or self.predicates
+        )
+
+    def ignore_events(self, *names):
+        self.events.update(name.upper() for name in names)
+        self._update()
+
+    def ignore_guilds(self, *guild_ids):
+        self.guild_ids.update(self._ids(guild_ids))
+        self._update()
+
+    def ignore_channels(self, *channel_ids):
+        self.channel_ids.update(self._ids(channel_ids))
+        self._update()
+
+    def ignore_authors(self, *author_ids):
+        self.author_ids.update(self._ids(author_ids))
+        self._update()
+
+    def sample(self, name, rate):
+        # Keep roughly `rate` (0-1) of the events called `name`.
+        if rate >= 1:
+            self.sample_rates.pop(name.upper(), None)
+        else:
+            self.sample_rates[name.upper()] = rate
+        self._update()
+
+    def add_predicate(self, predicate):
+        # predicate(event_name, data) returning True drops the event.
+        self.predicates.append(predicate)
+        self._update()
+
+    def remove_predicate(self, predicate):
+        self.predicates.remove(predicate)
+        self._update()
+
+    def clear(self):
+        self.__init__()
+
+    def drop(self, name, data):
+        if self._should_drop(name, data):
+            self.dropped += 1
+            return True
+        return False
+
+    def _should_drop(self, name, data):
+        if name in self.events:
+            return True
+
+        rate = self.sample_rates.get(name)
+        if rate is not None and random.random() >= rate:
+            return True
+
+        if isinstance(data, dict):
+            if self.guild_ids and data.get('guild_id') in self.guild_ids:
+                return True
+
+            if self.channel_ids and data.get('channel_id') in self.channel_ids:
+                return True
+
+            if self.author_ids:
+                author = data.get('author') or data.get('user')
+                if isinstance(author, dict) and author.get('id') in self.author_ids:
+                    return True
+
+        for predicate in self.predicates:
+            if predicate(name, data):
+                return True
+
+        return False
+
+
+class IdentifyScheduler:
+    IDENTIFY_INTERVAL = 5.0
+    SESSION_START_RESET = 24 * 60 * 60
+
+    def __init__(self, loop, *, max_concurrency=1, total=1000, remaining=1000, reset_after=0.0):
+        self.loop = loop
+        self.max_concurrency = max_concurrency
+        self.total = total
+        self.remaining = remaining
+        self.reset_at = loop.time() + reset_after
+
+        self._locks = {}
+        self._last_identify = {}
+        self._budget_lock = asyncio.Lock()
+
+    @classmethod
+    def from_session_start_limit(cls, loop, data):
+        return cls(
+            loop,
+            max_concurrency=data.get('max_concurrency', 1),
+            total=data['total'],
+            remaining=data['remaining'],
+            reset_after=data['reset_after'] / 1000
+        )
+
+    def get_bucket(self, shard_id):
+        return shard_id % self.max_concurrency
+
+    async def _consume_session_start(self):
+        async with self._budget_lock:
+            if self.remaining <= 0:
+                # The daily session start budget ran out, nothing can
+                # identify until Discord resets it.
+                await asyncio.sleep(max((0, self.reset_at - self.loop.time())))
+                self.remaining = self.total
+                self.reset_at = self.loop.time() + self.SESSION_START_RESET
+
+            self.remaining -= 1
+
+    async def acquire(self, shard_id):
+        bucket = self.get_bucket(shard_id)
+
+        lock = self._locks.get(bucket)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[bucket] = lock
+
+        async with lock:
+            last = self._last_identify.get(bucket)
+            if last is not None:
+                delay = last + self.IDENTIFY_INTERVAL - self.loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            await self._consume_session_start()
+            self._last_identify[bucket] = self.loop.time()
+
+
 class Sharder(EventPusher):
     handlers = (
-        ChannelCreateHandler, ChannelUpdateHandler, ChannelDeleteHandler,
+        ReadyHandler, ChannelCreateHandler, ChannelUpdateHandler, ChannelDeleteHandler,
         ChannelPinsUpdateHandler, GuildCreateHandler, GuildUpdateHandler,
-        GuildDeleteHandler, MessageCreateHandler
+        GuildDeleteHandler, MessageCreateHandler, MessageUpdateHandler,
+        MessageDeleteHandler, MessageDeleteBulkHandler, MessageReactionAddHandler,
+        MessageReactionRemoveHandler, MessageReactionRemoveAllHandler,
+        MessageReactionRemoveEmojiHandler, GuildMemberAddHandler,
+        GuildMemberUpdateHandler, GuildMemberRemoveHandler, GuildMembersChunkHandler,
+        GuildRoleCreateHandler,
+        GuildRoleUpdateHandler, GuildRoleDeleteHandler, GuildEmojisUpdateHandler,
+        PresenceUpdateHandler, VoiceStateUpdateHandler
     )
 
-    def __init__(self, client, *, max_shards=None, intents=None):
+    def __init__(
+        self,
+        client,
+        *,
+        max_shards=None,
+        intents=None,
+        shard_ids=None,
+        shard_count=None,
+        gateway_data=None
+    ):
         super().__init__(client.loop)
 
         self.client = client
         self.max_shards = max_shards
-        self.multi_sharded = self.max_shards > 1
+        self.multi_sharded = (shard_count or max_shards or 1) > 1
         self.intents = intents
+        self._handlers = {
+            name: handler for name, handler in self._handlers.items()
+            if self.intent_enabled(name)
+        }
         self.shards = {}
-        self.gateway_data = None
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.gateway_data = gateway_data
+        self.identify_scheduler = None
+        self.event_filter = EventFilter()
+        self.event_counts = collections.Counter()
+        self.capture = None
         self.token = None
 
+        self._raw_listeners = {}
+        self._raw_dispatch = {}
+        self._raw_only = set()
+
+        self.max_chunk_requests = 4
+        self._chunk_requests = {}
+        self._chunk_semaphore = None
+
+    @property
+    def member_chunk_semaphore(self):
+        if self._chunk_semaphore is None:
+            self._chunk_semaphore = asyncio.Semaphore(self.max_chunk_requests)
+        return self._chunk_semaphore
+
+    def _invalidate(self):
+        super()._invalidate()
+        self._raw_dispatch.clear()
+
+    def register_raw_listener(self, name, func, *, view=False):
+        # Raw listeners get the decoded `d` of a DISPATCH before handlers
+        # touch the cache, or a read-only mapping over it with view=True.
+        name = name.upper()
+        listeners = self._raw_listeners.get(name)
+
+        if listeners is None:
+            listeners = []
+            self._raw_listeners[name] = listeners
+
+        listeners.append((func, view))
+        self._raw_dispatch.pop(name, None)
+
+    def remove_raw_listener(self, name, func):
+        name = name.upper()
+        listeners = self._raw_listeners.get(name)
+
+        if listeners is None:
+            return
+
+        for listener in listeners:
+            if listener[0] == func:
+                listeners.remove(listener)
+                break
+
+        self._raw_dispatch.pop(name, None)
+
+    def on_raw(self, name=None, *, view=False):
+        def wrapped(func):
+            self.register_raw_listener(name or func.__name__, func, view=view)
+            return func
+
+        return wrapped
+
+    def skip_hydration(self, *names):
+        # These events only reach raw listeners, handlers and regular
+        # listeners never see them and nothing is cached.
+        self._raw_only.update(name.upper() for name in names)
+
+    def _compile_raw(self, name):
+        callbacks = []
+
+        for func, view in self._raw_listeners.get(name, ()):
+            callback = self._compile_listener(name.lower(), func)
+
+            if view:
+                callback = self._viewed(callback)
+
+            callbacks.append(callback)
+
+        callbacks = tuple(callbacks)
+        self._raw_dispatch[name] = callbacks
+        return callbacks
+
+    @staticmethod
+    def _viewed(callback):
+        def call(data):
+            callback(types.MappingProxyType(data))
+        return call
+
+    def push_raw_event(self, name, data):
+        callbacks = self._raw_dispatch.get(name)
+        if callbacks is None:
+            callbacks = self._compile_raw(name)
+
+        for callback in callbacks:
+            callback(data)
+
+        if name not in self._raw_only:
+            self.push_event(name, data)
+
+    def _set_reading(self, reading):
+        for shard in self.shards.values():
+            if reading:
+                shard.resume_reading()
+            else:
+                shard.pause_reading()
+
+    @property
+    def latencies(self):
+        # Recent heartbeat round trips of every shard, oldest first.
+        return {
+            shard_id: list(shard.heartbeat_handler.latencies)
+            for shard_id, shard in self.shards.items()
+        }
+
+    def start_capture(self, path, *, compress=None):
+        # Every shard appends to the same capture, records carry the shard id.
+        self.stop_capture()
+        self.capture = GatewayCapture(path, compress=compress)
+
+        for shard in self.shards.values():
+            shard.start_capture(self.capture)
+
+        return self.capture
+
+    def stop_capture(self):
+        if self.capture is None:
+            return
+
+        for shard in self.shards.values():
+            shard.stop_capture()
+
+        self.capture.close()
+        self.capture = None
+
+    def intent_enabled(self, name):
+        if self.intents is None:
+            return True
+
+        intent = EVENT_INTENTS.get(name.lower())
+        return intent is None or bool(self.intents & intent)
+
     async def connect(self):
         self.token = self.client.token
-        self.gateway_data = await self.client.rest.get_gateway_bot()
 
-        shards = min((self.max_shards, self.gateway_data['shards']))
+        if self.gateway_data is None:
+            self.gateway_data = await self.client.rest.get_gateway_bot()
 
-        for shard_id in range(shards):
+        if self.shard_count is None:
+            self.shard_count = min((
+                self.max_shards or self.gateway_data['shards'],
+                self.gateway_data['shards']
+            ))
+        self.multi_sharded = self.shard_count > 1
+
+        if self.identify_scheduler is None:
+            self.identify_scheduler = IdentifyScheduler.from_session_start_limit(
+                self.loop, self.gateway_data['session_start_limit']
+            )
+
+        shard_ids = self.shard_ids
+        if shard_ids is None:
+            shard_ids = range(self.shard_count)
+
+        for shard_id in shard_ids:
             shard = Shard(self.gateway_data['url'], self, shard_id)
             self.shards[shard_id] = shard
 
-        for shard in self.shards.values():
-            await shard.connect(port=443, ssl=True)
+            if self.capture is not None:
+                shard.start_capture(self.capture)
+
+        # Identifying is throttled by the scheduler, the connections
+        # themselves can all be opened at once.
+        await asyncio.gather(*(shard.connect() for shard in self.shards.values()))
@@ -7,6 +7,7 @@ from .member import GuildMemberState
 from .role import RoleState
 from .state import BaseState
 from .utils import _try_snowflake, undefined
+from .voice import VoiceStateState
 
 
 class GuildWidget(structures.GuildWidget):
@@ -143,27 +144,44 @@ class GuildPreview(structures.GuildPreview):
 
         return dct
 
-    def _update(self, *args, **kwargs):
-        structures.GuildPreview._update(self, *args, **kwargs)
-        emojis_seen = set()
+    @staticmethod
+    def _reconcile(state, items, add, key, full):
+        # Adds or updates every item and, for a snapshot of an existing
+        # object, drops whatever the snapshot no longer contains.
+        seen = {key(add(item)) for item in items}
 
-        for emoji in self._emojis:
-            emoji = self.emojis._add(emoji)
-            emojis_seen.add(emoji.id)
+        if full:
+            for item_id in state._items.keys() - seen:
+                state.pop(item_id)
 
-        for emoji in self.emojis:
-            if emoji.id not in emojis_seen:
-                self.emojis.pop(emoji.id)
+    def _update_children(self, data, full):
+        if 'emojis' in data:
+            self._reconcile(
+                self.emojis, data['emojis'], self.emojis._add,
+                lambda emoji: emoji.id, full
+            )
+
+    def _update(self, data, set_default=False):
+        structures.GuildPreview._update(self, data, set_default)
+        # set_default is only passed by unmarshal, a new object has nothing
+        # stale to remove.
+        self._update_children(data, not set_default)
+
+    def _patch(self, data):
+        super()._patch(data)
+        self._update_children(data, True)
 
 
 class Guild(GuildPreview, structures.Guild):
     def __init__(self, *, state: 'GuildState'):
         super().__init__(state)
+        self.voice_states = VoiceStateState(self._state.client, guild=self)
 
     @property
     def shard(self):
-        shard_id = ((self.id >> 22) % len(self._state.client.sharder.shards))
-        return self._state.client.sharder.shards.get(shard_id)
+        sharder = self._state.client.sharder
+        shard_id = ((self.id >> 22) % (sharder.shard_count or len(sharder.shards)))
+        return sharder.shards.get(shard_id)
 
     @property
     def owner(self):
@@ -201,40 +219,35 @@ class Guild(GuildPreview, structures.Guild):
 
         return dct
 
-    def _update(self, *args, **kwargs):
-        GuildPreview._update(self, *args, **kwargs)
-        channels_seen = set()
-        members_seen = set()
-        roles_seen = set()
-
-        for channel in self._channels:
-            channel = self._state.client.channels._add(channel, guild=self)
-            channels_seen.add(channel.id)
-
-        for member in self._members:
-            member = self.members._add(member)
-            members_seen.add(member.user.id)
-
-        for role in self._roles:
-            role = self.roles._add(role)
-            roles_seen.add(role.id)
-
-        for channel in self.channels:
-            if channel.id not in channels_seen:
-                self.channels.pop(channel.id)
-
-        for member in self.members:
-            if member.user.id not in members_seen:
-                self.members.pop(member.id)
-
-        for role in self.roles:
-            if role.id not in roles_seen:
-                self.roles.pop(role.id)
-
-        if self._owner is not None:
-            owner = self._state.client.guilds._add(self._owner)
-            if owner is not None:
-                self.owner_id = owner.id
+    def _update_children(self, data, full):
+        super()._update_children(data, full)
+
+        if 'roles' in data:
+            self._reconcile(self.roles, data['roles'], self.roles._add, lambda role: role.id, full)
+
+        if 'channels' in data:
+            self._reconcile(
+                self.channels, data['channels'], self.channels._add,
+                lambda channel: channel.id, full
+            )
+
+        if 'members' in data:
+            # Large guilds only send a subset of their members, whatever was
+            # chunked in before has to stay.
+            self._reconcile(
+                self.members, data['members'], self.members._add,
+                lambda member: member.user.id, full and not data.get('large')
+            )
+
+        if 'voice_states' in data:
+            for voice_state in data['voice_states']:
+                self.voice_states._add(voice_state)
+
+        if 'presences' in data:
+            for presence in data['presences']:
+                member = self.members.get(presence['user']['id'], prefetch=False)
+                if member is not None:
+                    member._patch_presence(presence)
 
 
 class GuildBan(structures.GuildBan):
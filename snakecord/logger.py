@@ -18,7 +18,13 @@ class Handler(logging.Handler):
 
 NAME = __package__ + '.' if __package__ is not None else ''
 CONNECTION_LOGGER = logging.getLogger(NAME + 'connection')
+REST_LOGGER = logging.getLogger(NAME + 'rest')
+CLUSTER_LOGGER = logging.getLogger(NAME + 'cluster')
+EVENT_LOGGER = logging.getLogger(NAME + 'events')
 
 LOGGERS = {
-    CONNECTION_LOGGER
+    CONNECTION_LOGGER,
+    REST_LOGGER,
+    CLUSTER_LOGGER,
+    EVENT_LOGGER
 }
@@ -1,16 +1,28 @@
+import asyncio
+import collections
+import os
+
 from . import structures
+from .enums import Intents
 from .role import Role
 from .state import BaseState
+from .user import User
 from .utils import _try_snowflake, undefined
 
 
 class GuildMember(structures.GuildMember):
-    def __init__(self, *, state, guild, user=None):
+    def __init__(self, *, state, guild, user=None, cache=True):
         self._state = state
         self.guild = guild
         self.user = user
+        # Uncached members keep their user to themselves.
+        self._cache = cache
         self.roles = GuildMemberRoleState(self._state.client, member=self)
 
+        self.status = None
+        self.activities = []
+        self.client_status = {}
+
     async def edit(self, **kwargs):
         rest = self._state.client.rest
 
@@ -36,26 +48,386 @@ class GuildMember(structures.GuildMember):
                 self.roles._add(role)
 
         if self._user is not None:
-            self.user = self._state.client.users._add(self._user)
+            users = self._state.client.users
+            if self._cache:
+                self.user = users._add(self._user)
+            elif self.user is None:
+                self.user = User.unmarshal(self._user, state=users)
+            else:
+                self.user._update(self._user)
+
+    def _patch(self, data):
+        super()._patch(data)
+
+        if 'roles' in data:
+            self.roles.clear()
+            for role in self._roles:
+                self.roles._add(role)
+
+        if 'user' in data:
+            if self._cache:
+                self.user = self._state.client.users._patch(self._user)
+            else:
+                self.user._patch(self._user)
+
+    def _patch_presence(self, data):
+        self.status = data.get('status', self.status)
+        self.activities = data.get('activities', self.activities)
+        self.client_status = data.get('client_status', self.client_status)
+
+
+class MemberChunkRequest:
+    def __init__(
+        self,
+        state,
+        *,
+        query=None,
+        limit=0,
+        presences=False,
+        user_ids=None,
+        cache=True,
+        timeout=30.0,
+        maxsize=100
+    ):
+        self.state = state
+        self.guild = state.guild
+        self.client = state.client
+        self.loop = self.client.loop
+
+        self.query = query
+        self.limit = limit
+        self.presences = presences
+        self.user_ids = user_ids
+        self.cache = cache
+        self.timeout = timeout
+        self.maxsize = maxsize
+
+        self.nonce = os.urandom(8).hex()
+        self.chunk_count = None
+        self.chunks_received = 0
+        self.members_received = 0
+        self.not_found = []
+
+        self.sent = False
+        self.done = False
+        self.exception = None
+
+        self._chunks = collections.deque()
+        self._waiter = None
+        self._timer = None
+        self._task = None
+        self._shard = None
+        self._acquired = False
+        self._paused = False
+
+    def start(self):
+        if self._task is None:
+            self._task = self.loop.create_task(self._send())
+        return self
+
+    async def _send(self):
+        sharder = self.client.sharder
+
+        try:
+            # Limits how many guilds are chunked at once across all shards.
+            await sharder.member_chunk_semaphore.acquire()
+            self._acquired = True
+
+            if self.done:
+                self._finish()
+                return
+
+            shard = self.guild.shard
+            if shard is None:
+                raise RuntimeError('No shard is connected for guild %s' % self.guild.id)
+
+            self._shard = shard
+            sharder._chunk_requests[self.nonce] = self
+            shard.request_guild_members(
+                self.guild.id, query=self.query, limit=self.limit,
+                presences=self.presences, user_ids=self.user_ids, nonce=self.nonce
+            )
+        except asyncio.CancelledError:
+            self._finish()
+            raise
+        except Exception as e:
+            self._finish(e)
+        else:
+            self.sent = True
+            self._touch()
+            self._wake()
+
+    def _touch(self):
+        # The timeout runs whether or not anyone iterates, so a request
+        # nobody consumes still gives back its semaphore slot and shard.
+        if self._timer is not None:
+            self._timer.cancel()
+
+        if self.timeout is not None and not self.done:
+            self._timer = self.loop.call_later(self.timeout, self._expire)
+
+    def _expire(self):
+        self._timer = None
+        self._resume()
+        self._finish(asyncio.TimeoutError())
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def _feed(self, members, payload):
+        self.chunk_count = payload.get('chunk_count', 1)
+        self.chunks_received += 1
+        self.members_received += len(members)
+        self.not_found.extend(payload.get('not_found') or ())
+        self._chunks.append(members)
+
+        if len(self._chunks) >= self.maxsize and not self._paused:
+            # Nobody is consuming the chunks, stop reading the shard until
+            # they do instead of buffering the whole guild.
+            self._paused = True
+            self._shard.pause_reading()
+
+        if self.chunks_received >= self.chunk_count:
+            self._finish()
+        else:
+            self._touch()
+            self._wake()
+
+    def _resume(self):
+        if self._paused:
+            self._paused = False
+            self._shard.resume_reading()
+
+    def _finish(self, exception=None):
+        if self.exception is None:
+            self.exception = exception
+
+        self.done = True
+        self.client.sharder._chunk_requests.pop(self.nonce, None)
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if self._acquired:
+            self._acquired = False
+            self.client.sharder.member_chunk_semaphore.release()
+
+        self._wake()
+
+    def close(self):
+        self._chunks.clear()
+        self._resume()
+        self._finish()
+
+    def __aiter__(self):
+        return self.start()
+
+    async def __anext__(self):
+        while not self._chunks:
+            if self.done:
+                if self.exception is not None:
+                    raise self.exception
+                raise StopAsyncIteration
+
+            self._waiter = self.loop.create_future()
+            await self._waiter
+
+        members = self._chunks.popleft()
+        if self._paused and len(self._chunks) <= self.maxsize // 2:
+            self._resume()
+        if not self.done:
+            self._touch()
+
+        return members
+
+    async def _collect(self, limit):
+        members = []
+        async for chunk in self:
+            members.extend(chunk)
+            if limit is not None and len(members) >= limit:
+                self.close()
+                del members[limit:]
+                break
+        return members
+
+    async def collect(self, *, limit=None, timeout=None):
+        # Stops after limit members or timeout seconds overall, self.timeout
+        # only bounds the wait for each chunk.
+        try:
+            return await asyncio.wait_for(self._collect(limit), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self.close()
+            raise
+
+    def __await__(self):
+        return self.collect().__await__()
+
+    def __repr__(self):
+        return '<MemberChunkRequest guild={0.guild.id} nonce={0.nonce} ' \
+               'chunks={0.chunks_received}/{0.chunk_count}>'.format(self)
 
 
 class GuildMemberState(BaseState):
+    RESOLVE_WINDOW = 0.05
+    RESOLVE_BATCH = 100
+    # How long ids Discord reported as not in the guild are not asked for again.
+    NOT_FOUND_TTL = 60.0
+
     def __init__(self, client, guild):
         super().__init__(client)
         self.guild = guild
 
+        # user id -> future for lookups that are batched or in flight
+        self._resolving = {}
+        self._resolve_batch = []
+        self._resolve_handle = None
+        # user id -> loop time until which it is known not to be a member
+        self._not_found = {}
+
+    def get(self, item, default=None, *, prefetch=True):
+        item = _try_snowflake(item)
+        member = self._items.get(item)
+
+        if member is None:
+            if prefetch and self.client.lazy_members and not self._known_missing(item):
+                self._schedule_resolve(item)
+            return default
+
+        return member
+
     def _add(self, data, user=None):
         if user is None:
             user = self.client.users._add(data['user'])
-        member = self.get(user.id)
+        member = self._items.get(user.id)
         if member is not None:
             member._update(data)
             return member
 
         member = GuildMember.unmarshal(data, state=self, guild=self.guild, user=user)
         self._items[member.user.id] = member
+
+        if self._not_found:
+            self._not_found.pop(member.user.id, None)
+
+        if self._resolving:
+            future = self._resolving.pop(member.user.id, None)
+            if future is not None and not future.done():
+                future.set_result(member)
+
         return member
 
+    def _create(self, data):
+        # Builds a member without caching it or its user.
+        return GuildMember.unmarshal(data, state=self, guild=self.guild, cache=False)
+
+    def chunk(
+        self,
+        *,
+        query=None,
+        limit=0,
+        presences=False,
+        user_ids=None,
+        cache=True,
+        timeout=30.0,
+        maxsize=100
+    ):
+        intents = self.client.sharder.intents
+        if intents is not None:
+            if user_ids is None and not query and not intents & Intents.GUILD_MEMBERS:
+                raise ValueError('Requesting every member needs the GUILD_MEMBERS intent')
+
+            if presences and not intents & Intents.GUILD_PRESENCES:
+                raise ValueError('Requesting presences needs the GUILD_PRESENCES intent')
+
+        request = MemberChunkRequest(
+            self, query=query, limit=limit, presences=presences,
+            user_ids=user_ids, cache=cache, timeout=timeout, maxsize=maxsize
+        )
+        return request.start()
+
+    def _known_missing(self, user_id):
+        expires = self._not_found.get(user_id)
+        if expires is None:
+            return False
+
+        if expires <= self.client.loop.time():
+            del self._not_found[user_id]
+            return False
+
+        return True
+
+    def _schedule_resolve(self, user_id):
+        future = self._resolving.get(user_id)
+        if future is not None:
+            return future
+
+        future = self.client.loop.create_future()
+        self._resolving[user_id] = future
+        self._resolve_batch.append(user_id)
+
+        if len(self._resolve_batch) >= self.RESOLVE_BATCH:
+            self._flush_resolve()
+        elif self._resolve_handle is None:
+            self._resolve_handle = self.client.loop.call_later(
+                self.RESOLVE_WINDOW, self._flush_resolve
+            )
+
+        return future
+
+    def _flush_resolve(self):
+        if self._resolve_handle is not None:
+            self._resolve_handle.cancel()
+            self._resolve_handle = None
+
+        batch = self._resolve_batch
+        self._resolve_batch = []
+
+        # Members that arrived some other way since they were batched
+        # already resolved their futures.
+        user_ids = [user_id for user_id in batch if user_id in self._resolving]
+
+        for i in range(0, len(user_ids), self.RESOLVE_BATCH):
+            self.client.loop.create_task(
+                self._resolve_many(user_ids[i:i + self.RESOLVE_BATCH])
+            )
+
+    async def _resolve_many(self, user_ids):
+        try:
+            await self.chunk(user_ids=user_ids)
+        except Exception as e:
+            for user_id in user_ids:
+                future = self._resolving.pop(user_id, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+                    # Prefetches from get() are never awaited.
+                    future.exception()
+        else:
+            now = self.client.loop.time()
+            expires = now + self.NOT_FOUND_TTL
+
+            for user_id in user_ids:
+                member = self._items.get(user_id)
+                if member is None:
+                    self._not_found[user_id] = expires
+
+                future = self._resolving.pop(user_id, None)
+                if future is not None and not future.done():
+                    future.set_result(member)
+
+            for user_id in [key for key, until in self._not_found.items() if until <= now]:
+                del self._not_found[user_id]
+
+    async def resolve(self, user_id):
+        user_id = _try_snowflake(user_id)
+
+        member = self._items.get(user_id)
+        if member is not None or self._known_missing(user_id):
+            return member
+
+        return await self._schedule_resolve(user_id)
+
     async def fetch(self, member_id):
         rest = self.client.rest
         data = await rest.get_guild_member(self.guild.id, member_id)
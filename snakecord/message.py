@@ -62,6 +62,8 @@ class Message(structures.Message):
 
         if self.channel is not None:
             self.guild = self.channel.guild
+        else:
+            self.guild = self._state.client.guilds.get(self.guild_id)
 
         if self.guild is not None and self._member is not None:
             if self._member.get('user') is None:
@@ -70,20 +72,41 @@ class Message(structures.Message):
         else:
             self.author = self._state.client.users._add(self._author)
 
+    def _patch(self, data):
+        super()._patch(data)
+
+        if 'reactions' in data:
+            self.reactions.clear()
+            for reaction in self._reactions:
+                self.reactions._add(reaction)
+
 
 class ReactionState(BaseState):
     def __init__(self, client, message):
         super().__init__(client)
         self.message = message
 
+    @staticmethod
+    def _emoji_key(emoji):
+        # Custom emojis are keyed by id, unicode ones by the emoji itself.
+        if isinstance(emoji, dict):
+            emoji = emoji.get('id') or emoji.get('name')
+        return _try_snowflake(emoji)
+
+    def get(self, emoji, default=None):
+        return self._items.get(self._emoji_key(emoji), default)
+
+    def pop(self, emoji, *args):
+        return self._items.pop(self._emoji_key(emoji), *args)
+
     def _add(self, data) -> Reaction:
         reaction = self.get(data['emoji'])
         if reaction is not None:
             reaction._update(data)
             return reaction
 
-        reaction = Reaction.unmarshal(data)
-        self._items[reaction.emoji] = reaction
+        reaction = Reaction.unmarshal(data, state=self, message=self.message)
+        self._items[self._emoji_key(reaction.emoji)] = reaction
         return reaction
 
     async def add(self, emoji):
@@ -0,0 +1,239 @@
+import bisect
+import collections
+import math
+import time
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, p):
+        # Upper bound of the bucket the percentile falls in.
+        if not self.count:
+            return None
+
+        target = self.count * p
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+
+        return float('inf')
+
+    def snapshot(self):
+        cumulative = []
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            cumulative.append((bound, seen))
+
+        return {'count': self.count, 'sum': self.sum, 'buckets': cumulative}
+
+
+class Metrics:
+    def __init__(self, client):
+        self.client = client
+        self.started = time.monotonic()
+
+        # (name, labels) -> value, labels being a sorted tuple of pairs
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+        self.collectors = [
+            self._collect_shards, self._collect_rest, self._collect_caches,
+            self._collect_queues
+        ]
+        self.callbacks = []
+
+        self._last_counters = {}
+        self._last_snapshot = self.started
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def count(self, name, value, **labels):
+        # Sets a counter kept somewhere else, like a shard's byte count.
+        self.counters[self._key(name, labels)] = value
+
+    def set(self, name, value, **labels):
+        self.gauges[self._key(name, labels)] = value
+
+    def histogram(self, name, *, buckets=DEFAULT_BUCKETS, **labels):
+        key = self._key(name, labels)
+        histogram = self.histograms.get(key)
+
+        if histogram is None:
+            histogram = Histogram(buckets)
+            self.histograms[key] = histogram
+
+        return histogram
+
+    def observe(self, name, value, **labels):
+        self.histogram(name, **labels).observe(value)
+
+    def add_collector(self, func):
+        self.collectors.append(func)
+
+    def remove_collector(self, func):
+        self.collectors.remove(func)
+
+    def add_callback(self, func):
+        self.callbacks.append(func)
+
+    def remove_callback(self, func):
+        self.callbacks.remove(func)
+
+    def _collect_shards(self, metrics):
+        sharder = self.client.sharder
+
+        for name, count in sharder.event_counts.items():
+            self.count('gateway_events_total', count, event=name)
+
+        for shard_id, shard in sharder.shards.items():
+            self.count('gateway_bytes_received_total', shard.bytes_received, shard=shard_id)
+            self.count('gateway_bytes_sent_total', shard.bytes_sent, shard=shard_id)
+            self.count('gateway_frames_total', shard.frames_received, shard=shard_id)
+            self.count('gateway_decode_seconds_total', shard.decode_time, shard=shard_id)
+
+            latency = shard.heartbeat_handler.latency
+            if not math.isinf(latency):
+                self.set('gateway_last_latency_seconds', latency, shard=shard_id)
+
+    def _collect_rest(self, metrics):
+        rest = self.client.rest
+
+        for bucket, ratelimiter in rest.ratelimiters.items():
+            self.set('rest_queue_depth', len(ratelimiter.queue), bucket=bucket)
+
+        self.set('rest_global_queue_depth', len(rest.global_ratelimiter._waiters))
+
+    def _collect_caches(self, metrics):
+        client = self.client
+
+        self.set('cache_size', len(client.users), state='users')
+        self.set('cache_size', len(client.guilds), state='guilds')
+        self.set('cache_size', len(client.channels), state='channels')
+        self.set('cache_size', len(client.invites), state='invites')
+
+        members = roles = emojis = 0
+        for guild in client.guilds:
+            members += len(guild.members)
+            roles += len(guild.roles)
+            emojis += len(guild.emojis)
+
+        self.set('cache_size', members, state='members')
+        self.set('cache_size', roles, state='roles')
+        self.set('cache_size', emojis, state='emojis')
+
+    def _collect_queues(self, metrics):
+        for pusher in (self.client, self.client.sharder):
+            for name, stats in pusher.queue_stats().items():
+                self.set('dispatch_queue_depth', stats['depth'], queue=name)
+                if 'dropped' in stats:
+                    self.count('dispatch_dropped_total', stats['dropped'], queue=name)
+
+    def collect(self):
+        self.gauges.clear()
+        for collector in self.collectors:
+            collector(self)
+
+    def snapshot(self):
+        self.collect()
+
+        now = time.monotonic()
+        elapsed = now - self._last_snapshot
+
+        # Per second rates of every counter since the previous snapshot.
+        rates = {}
+        if elapsed > 0:
+            for key, value in self.counters.items():
+                rates[key] = (value - self._last_counters.get(key, 0)) / elapsed
+
+        self._last_counters = dict(self.counters)
+        self._last_snapshot = now
+
+        def entries(items, func=lambda value: value):
+            return [
+                {'name': name, 'labels': dict(labels), 'value': func(value)}
+                for (name, labels), value in items
+            ]
+
+        snapshot = {
+            'uptime': now - self.started,
+            'counters': entries(self.counters.items()),
+            'rates': entries(rates.items()),
+            'gauges': entries(self.gauges.items()),
+            'histograms': entries(self.histograms.items(), Histogram.snapshot)
+        }
+
+        for callback in self.callbacks:
+            callback(snapshot)
+
+        return snapshot
+
+    def to_prometheus(self, *, prefix='snakecord_'):
+        self.collect()
+
+        def format_labels(labels, **extra):
+            labels = list(labels) + list(extra.items())
+            if not labels:
+                return ''
+
+            return '{%s}' % ','.join(
+                '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                for name, value in labels
+            )
+
+        def format_value(value):
+            if math.isinf(value):
+                return '+Inf' if value > 0 else '-Inf'
+            return repr(float(value))
+
+        lines = []
+
+        def add(kind, items):
+            grouped = collections.defaultdict(list)
+            for (name, labels), value in items:
+                grouped[prefix + name].append((labels, value))
+
+            for name, values in grouped.items():
+                lines.append('# TYPE %s %s' % (name, kind))
+                for labels, value in values:
+                    if kind == 'histogram':
+                        for bound, count in value.snapshot()['buckets']:
+                            lines.append('%s_bucket%s %s' % (
+                                name, format_labels(labels, le=format_value(bound)), count
+                            ))
+                        lines.append('%s_sum%s %s' % (
+                            name, format_labels(labels), format_value(value.sum)
+                        ))
+                        lines.append('%s_count%s %s' % (name, format_labels(labels), value.count))
+                    else:
+                        lines.append('%s%s %s' % (name, format_labels(labels), format_value(value)))
+
+        add('counter', self.counters.items())
+        add('gauge', self.gauges.items())
+        add('histogram', self.histograms.items())
+
+        return '\n'.join(lines) + '\n'
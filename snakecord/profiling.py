@@ -0,0 +1,113 @@
+import collections
+import time
+
+from .metrics import Histogram
+
+# Nanoseconds, from 1us to 1s.
+NS_BUCKETS = (
+    1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 500000,
+    1000000, 2500000, 5000000, 10000000, 25000000, 100000000, 1000000000
+)
+
+# The hooks in the hot paths only check this, it stays None unless
+# profiling is enabled.
+profiler = None
+
+
+class Span:
+    __slots__ = ('stage', 'start', 'duration', 'self_time', 'depth', 'attrs')
+
+    def __init__(self, stage, start, duration, self_time, depth, attrs):
+        self.stage = stage
+        self.start = start
+        self.duration = duration
+        self.self_time = self_time
+        self.depth = depth
+        self.attrs = attrs
+
+    def __repr__(self):
+        return '<Span {0.stage} duration={0.duration}ns self={0.self_time}ns ' \
+               'depth={0.depth}>'.format(self)
+
+
+class Profiler:
+    def __init__(self, *, spans=False, max_spans=10000, on_span=None):
+        # stage -> (inclusive histogram, exclusive histogram)
+        self.stages = {}
+        self.spans = collections.deque(maxlen=max_spans) if spans else None
+        self.on_span = on_span
+
+        # Time spent in nested stages, one entry per open stage.
+        self._children = []
+
+    def _histograms(self, stage):
+        histograms = self.stages.get(stage)
+        if histograms is None:
+            histograms = (Histogram(NS_BUCKETS), Histogram(NS_BUCKETS))
+            self.stages[stage] = histograms
+        return histograms
+
+    def enter(self):
+        self._children.append(0)
+        return time.perf_counter_ns()
+
+    def exit(self, stage, start, **attrs):
+        duration = time.perf_counter_ns() - start
+        self_time = duration - self._children.pop()
+
+        if self._children:
+            self._children[-1] += duration
+
+        self._record(stage, start, duration, self_time, attrs)
+
+    def record(self, stage, start, **attrs):
+        # For stages that span awaits, so they can't nest with the others.
+        duration = time.perf_counter_ns() - start
+        self._record(stage, start, duration, duration, attrs)
+
+    def _record(self, stage, start, duration, self_time, attrs):
+        inclusive, exclusive = self._histograms(stage)
+        inclusive.observe(duration)
+        exclusive.observe(self_time)
+
+        if self.spans is not None or self.on_span is not None:
+            span = Span(stage, start, duration, self_time, len(self._children), attrs)
+
+            if self.spans is not None:
+                self.spans.append(span)
+
+            if self.on_span is not None:
+                self.on_span(span)
+
+    def stats(self):
+        stats = {}
+
+        for stage, (inclusive, exclusive) in self.stages.items():
+            stats[stage] = {
+                'count': inclusive.count,
+                'total_ns': inclusive.sum,
+                'self_ns': exclusive.sum,
+                'mean_ns': inclusive.sum / inclusive.count,
+                'p50_ns': inclusive.percentile(0.5),
+                'p99_ns': inclusive.percentile(0.99),
+                'self_p99_ns': exclusive.percentile(0.99)
+            }
+
+        return stats
+
+    def reset(self):
+        self.stages.clear()
+        if self.spans is not None:
+            self.spans.clear()
+
+
+def enable(*, spans=False, max_spans=10000, on_span=None):
+    global profiler
+    profiler = Profiler(spans=spans, max_spans=max_spans, on_span=on_span)
+    return profiler
+
+
+def disable():
+    global profiler
+    current, profiler = profiler, None
+    return current
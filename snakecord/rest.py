@@ -1,16 +1,33 @@
 import aiohttp
 import asyncio
+import collections
 import functools
+import heapq
+import itertools
+import random
+import time
 
 from datetime import datetime
+from enum import IntEnum
 
+from . import profiling
+from .exceptions import HTTPError, RequestDeadlineExceeded
+from .logger import REST_LOGGER
 from .utils import JsonStructure, JsonField, undefined
 
 
+class RequestPriority(IntEnum):
+    INTERACTIVE = 0
+    NORMAL = 1
+    BACKGROUND = 2
+
+
 class Ratelimiter:
-    def __init__(self, rest_session):
+    def __init__(self, rest_session, *, bucket=None, background_reserve=0.25):
         self.rest_session = rest_session
         self.loop = rest_session.loop
+        self.bucket = bucket
+        self.background_reserve = background_reserve
 
         self.limit = float('inf')
         self._remaining = float('inf')
@@ -20,6 +37,8 @@ class Ratelimiter:
 
         self.queue = []
         self._tasks = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
 
         self.current_burst_task: asyncio.Task = None
 
@@ -51,20 +70,89 @@ class Ratelimiter:
             )
         )
 
+    @property
+    def reserved(self):
+        # Quota that background requests are not allowed to touch, so
+        # interactive and normal requests never wait behind bulk work.
+        return int(self.limit * self.background_reserve)
+
     def _task_done_callback(self, task, fut):
         def set_result(task):
             self._tasks.remove(task)
-            fut.set_result(task.result())
+
+            if fut.done():
+                return
+
+            if task.cancelled():
+                fut.cancel()
+            elif task.exception() is not None:
+                fut.set_exception(task.exception())
+            else:
+                fut.set_result(task.result())
+
+        def cancel_task(fut):
+            if fut.cancelled():
+                task.cancel()
 
         task.add_done_callback(set_result)
+        fut.add_done_callback(cancel_task)
+
+    def _expire(self, fut, deadline):
+        if not fut.done():
+            fut.set_exception(RequestDeadlineExceeded(deadline))
+
+    def _drop_unreachable(self, when):
+        # Requests that can't be sent before their deadline are failed now,
+        # before they get a chance to consume any of the bucket's quota.
+        for priority, count, req, fut, deadline, handle in self.queue:
+            if deadline is not None and deadline < when:
+                self._expire(fut, deadline)
+
+    def _peek_priority(self):
+        while self.queue:
+            priority, count, req, fut, deadline, handle = self.queue[0]
+
+            if not fut.done():
+                return priority
+
+            heapq.heappop(self.queue)
+            if handle is not None:
+                handle.cancel()
+
+        return None
+
+    def _next_request(self):
+        while self.queue:
+            priority, count, req, fut, deadline, handle = heapq.heappop(self.queue)
+
+            if handle is not None:
+                handle.cancel()
+
+            if not fut.done():
+                return req, fut
+
+        return None
 
     def _burst_run_once(self):
-        req, fut = self.queue.pop(0)
+        item = self._next_request()
+        if item is None:
+            return False
+
+        req, fut = item
         task = self.loop.create_task(req())
 
         self._tasks.append(task)
         self._task_done_callback(task, fut)
 
+        return True
+
+    async def _wait_for_reset(self):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.reset_after)
+        except asyncio.TimeoutError:
+            pass
+
     async def do_burst(self):
         async with self.lock:
             if not self.ready:
@@ -73,17 +161,42 @@ class Ratelimiter:
                 while self.queue:
                     await asyncio.sleep(0)
                     if self.remaining == 0:
-                        await asyncio.sleep(self.reset_after)
+                        reset_after = self.reset_after
+                        self._drop_unreachable(self.loop.time() + reset_after)
+                        await asyncio.sleep(reset_after)
 
-                    self.remaining -= 1
-                    self._burst_run_once()
+                    priority = self._peek_priority()
+                    if priority is None:
+                        break
+
+                    if priority == RequestPriority.BACKGROUND and \
+                            self.remaining <= self.reserved:
+                        await self._wait_for_reset()
+                        continue
+
+                    if self._burst_run_once():
+                        self.remaining -= 1
 
             self.current_burst_task = None
 
-    def request(self, req):
+    def request(self, req, deadline=None, priority=RequestPriority.NORMAL):
         fut = self.loop.create_future()
 
-        self.queue.append((req, fut))
+        if deadline is not None:
+            if deadline <= self.loop.time():
+                self._expire(fut, deadline)
+                return fut
+
+            handle = self.loop.call_at(deadline, self._expire, fut, deadline)
+        else:
+            handle = None
+
+        entry = (priority, next(self._counter), req, fut, deadline, handle)
+        heapq.heappush(self.queue, entry)
+
+        if priority != RequestPriority.BACKGROUND:
+            self._wakeup.set()
+
         if not self.ready:
             self.loop.create_task(self.do_burst())
 
@@ -93,6 +206,90 @@ class Ratelimiter:
         return fut
 
 
+class GlobalRatelimiter:
+    def __init__(self, rest_session, *, rate=50, per=1.0, background_reserve=0.25):
+        self.rest_session = rest_session
+        self.loop = rest_session.loop
+        self.rate = rate
+        self.per = per
+        self.background_reserve = background_reserve
+
+        self._tokens = rate
+        self._updated = self.loop.time()
+        self._locked_until = 0
+
+        self._waiters = []
+        self._counter = itertools.count()
+        self._handle = None
+
+    @property
+    def reserved(self):
+        return int(self.rate * self.background_reserve)
+
+    @property
+    def locked(self):
+        return self.loop.time() < self._locked_until
+
+    def _refill(self):
+        now = self.loop.time()
+        elapsed = now - self._updated
+        self._tokens = min((self.rate, self._tokens + elapsed * self.rate / self.per))
+        self._updated = now
+
+    def _schedule(self, when):
+        self._handle = self.loop.call_at(when, self._release)
+
+    def _release(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+        while self._waiters:
+            priority, count, fut = self._waiters[0]
+
+            if fut.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            now = self.loop.time()
+            if now < self._locked_until:
+                return self._schedule(self._locked_until)
+
+            self._refill()
+
+            if priority == RequestPriority.BACKGROUND:
+                needed = self.reserved + 1
+            else:
+                needed = 1
+
+            if self._tokens < needed:
+                delay = (needed - self._tokens) * self.per / self.rate
+                return self._schedule(now + delay)
+
+            heapq.heappop(self._waiters)
+            self._tokens -= 1
+            fut.set_result(None)
+
+    def _expire(self, fut, deadline):
+        if not fut.done():
+            fut.set_exception(RequestDeadlineExceeded(deadline))
+
+    def acquire(self, priority=RequestPriority.NORMAL, deadline=None):
+        fut = self.loop.create_future()
+
+        if deadline is not None:
+            handle = self.loop.call_at(deadline, self._expire, fut, deadline)
+            fut.add_done_callback(lambda fut: handle.cancel())
+
+        heapq.heappush(self._waiters, (priority, next(self._counter), fut))
+        self._release()
+        return fut
+
+    def lock(self, retry_after):
+        self._locked_until = max((self._locked_until, self.loop.time() + retry_after))
+        self._release()
+
+
 class RatelimitedResponse(JsonStructure):
     __json_fields__ = {
         'global_ratelimit': JsonField('global'),
@@ -105,32 +302,327 @@ class RatelimitedResponse(JsonStructure):
     message: str
 
 
+class RetryBudget:
+    def __init__(self, *, ratio=0.2, minimum=10, window=10.0):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.window = window
+
+        self._requests = collections.deque()
+        self._retries = collections.deque()
+
+    def _expire(self, now):
+        cutoff = now - self.window
+
+        while self._requests and self._requests[0] < cutoff:
+            self._requests.popleft()
+
+        while self._retries and self._retries[0] < cutoff:
+            self._retries.popleft()
+
+    @property
+    def available(self):
+        self._expire(time.monotonic())
+        allowed = self.minimum + len(self._requests) * self.ratio
+        return max((0, int(allowed - len(self._retries))))
+
+    def deposit(self):
+        self._requests.append(time.monotonic())
+
+    def withdraw(self):
+        if self.available == 0:
+            return False
+
+        self._retries.append(time.monotonic())
+        return True
+
+
+class RetryAttempt:
+    def __init__(self, method, url, attempt, delay, *, status=None, exception=None):
+        self.method = method
+        self.url = url
+        self.attempt = attempt
+        self.delay = delay
+        self.status = status
+        self.exception = exception
+
+    def __repr__(self):
+        reason = self.status if self.exception is None else type(self.exception).__name__
+        return '<RetryAttempt {0.method} {0.url} attempt={0.attempt} ' \
+               'delay={0.delay:.3f} reason={1}>'.format(self, reason)
+
+
+class RetryPolicy:
+    IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+
+    # Failing to connect means nothing was sent, so these are retried
+    # whatever the method.
+    UNPROCESSED_EXCEPTIONS = (aiohttp.ClientConnectorError,)
+
+    # A 502 from Discord's edge usually means the API never saw the request,
+    # but it can also follow a write that went through upstream. Retrying a
+    # POST on it may send a message twice, so that needs retry_bad_gateway.
+    BAD_GATEWAY_STATUSES = frozenset((502,))
+
+    RETRY_STATUSES = frozenset((500, 502, 503, 504))
+    RETRY_EXCEPTIONS = (
+        aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+        asyncio.TimeoutError
+    )
+
+    def __init__(
+        self,
+        *,
+        max_retries=5,
+        max_ratelimit_retries=5,
+        backoff_base=0.5,
+        backoff_max=30.0,
+        jitter=True,
+        budget=None,
+        retry_bad_gateway=False
+    ):
+        self.max_retries = max_retries
+        self.max_ratelimit_retries = max_ratelimit_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.budget = budget or RetryBudget()
+        self.retry_bad_gateway = retry_bad_gateway
+
+    def is_idempotent(self, method):
+        return method.upper() in self.IDEMPOTENT_METHODS
+
+    def backoff(self, attempt):
+        delay = min((self.backoff_max, self.backoff_base * 2 ** attempt))
+
+        if self.jitter:
+            delay = random.uniform(0, delay)
+
+        return delay
+
+    # These only decide whether a failure is retryable, the budget is
+    # withdrawn from once the retry is known to fit the deadline.
+    def should_retry_status(self, method, status, attempt):
+        if status not in self.RETRY_STATUSES or attempt >= self.max_retries:
+            return False
+
+        if self.is_idempotent(method):
+            return True
+
+        return self.retry_bad_gateway and status in self.BAD_GATEWAY_STATUSES
+
+    def should_retry_exception(self, method, exc, attempt):
+        if not isinstance(exc, self.RETRY_EXCEPTIONS) or attempt >= self.max_retries:
+            return False
+
+        return isinstance(exc, self.UNPROCESSED_EXCEPTIONS) or self.is_idempotent(method)
+
+    def should_retry_ratelimit(self, attempt):
+        return attempt < self.max_ratelimit_retries
+
+
+class MultipartForm:
+    def __init__(self, payload, files):
+        self.payload = payload
+        self.files = files
+
+    @property
+    def replayable(self):
+        return all(file.replayable for file in self.files)
+
+    def build(self, loop=None):
+        # Built per attempt, only the file handles are (re)opened here and
+        # their contents are streamed while the request is written.
+        writer = aiohttp.MultipartWriter('form-data')
+
+        part = writer.append_json(self.payload)
+        part.set_content_disposition('form-data', name='payload_json')
+
+        for index, file in enumerate(self.files):
+            headers = None
+            if file.content_type is not None:
+                headers = {'Content-Type': file.content_type}
+
+            part = writer.append(file.open(loop), headers)
+            part.set_content_disposition(
+                'form-data', name='file%s' % index, filename=file.filename
+            )
+
+        return writer
+
+
+class RestRequest:
+    def __init__(
+        self,
+        session,
+        ratelimiter,
+        method,
+        url,
+        kwargs,
+        *,
+        form=None,
+        deadline=None,
+        priority=RequestPriority.NORMAL
+    ):
+        self.session = session
+        self.ratelimiter = ratelimiter
+        self.method = method
+        self.url = url
+        self.kwargs = kwargs
+        self.form = form
+        self.deadline = deadline
+        self.priority = priority
+
+        self.attempt = 0
+        self.ratelimit_attempt = 0
+        self.sent = False
+
+    @property
+    def replayable(self):
+        return not self.sent or self.form is None or self.form.replayable
+
+    def __call__(self):
+        kwargs = self.kwargs
+        if self.form is not None:
+            kwargs = dict(kwargs, data=self.form.build(self.session.loop))
+
+        self.sent = True
+        return self.session.client_session.request(self.method, self.url, **kwargs)
+
+
 class RestSession:
     URL = 'https://discord.com/api/v7/'
 
-    def __init__(self, client):
+    def __init__(self, client, *, retry_policy=None, global_ratelimiter=None):
         self.client = client
         self.loop = self.client.loop
 
         self.ratelimiters = {}
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.global_ratelimiter = global_ratelimiter or GlobalRatelimiter(self)
         self.client_session = aiohttp.ClientSession()
 
-    async def _request(self, ratelimiter, req):
-        resp = await req()
+    def _retry(self, request, attempt, delay, **kwargs):
+        retry = RetryAttempt(request.method, request.url, attempt + 1, delay, **kwargs)
+
+        REST_LOGGER.debug('Retrying %s %s in %.2fs (attempt %s, reason %s)',
+                          request.method, request.url, delay, retry.attempt,
+                          kwargs.get('status') or kwargs.get('exception'))
+        self.client.push_event('http_retry', retry)
+
+    def _enqueue(self, request):
+        actual_req = functools.partial(self._request, request)
+        return request.ratelimiter.request(actual_req, request.deadline, request.priority)
+
+    def _within_deadline(self, deadline, delay):
+        return deadline is None or self.loop.time() + delay < deadline
+
+    async def _request(self, request):
+        policy = self.retry_policy
+        meth = request.method
+        deadline = request.deadline
+        ratelimiter = request.ratelimiter
+
+        if request.attempt == 0 and request.ratelimit_attempt == 0:
+            policy.budget.deposit()
+
+        try:
+            await self.global_ratelimiter.acquire(request.priority, deadline)
+        except (RequestDeadlineExceeded, asyncio.CancelledError):
+            # do_burst already counted this request against the bucket,
+            # give the slot back since it never reached Discord.
+            ratelimiter.remaining = min(ratelimiter.remaining + 1, ratelimiter.limit)
+            raise
+
+        # Owners other than Client, like the cluster supervisor, have no metrics.
+        metrics = getattr(self.client, 'metrics', None)
+        profiler = profiling.profiler
+        if profiler is not None:
+            profile_start = time.perf_counter_ns()
+
+        start = time.perf_counter()
+        try:
+            resp = await request()
+        except Exception as e:
+            if metrics is not None:
+                metrics.inc('rest_errors_total', bucket=ratelimiter.bucket,
+                            error=type(e).__name__)
+            if profiler is not None:
+                profiler.record('rest.request', profile_start, method=meth,
+                                bucket=ratelimiter.bucket, error=type(e).__name__)
+
+            delay = policy.backoff(request.attempt)
+
+            if not self._within_deadline(deadline, delay) or not request.replayable:
+                raise
+
+            if not policy.should_retry_exception(meth, e, request.attempt):
+                raise
+
+            if not policy.budget.withdraw():
+                raise
+
+            self._retry(request, request.attempt, delay, exception=e)
+            await asyncio.sleep(delay)
+
+            request.attempt += 1
+            return await self._enqueue(request)
+
+        if metrics is not None:
+            metrics.observe('rest_request_seconds', time.perf_counter() - start,
+                            bucket=ratelimiter.bucket)
+            metrics.inc('rest_responses_total', bucket=ratelimiter.bucket, status=resp.status)
+        if profiler is not None:
+            profiler.record('rest.request', profile_start, method=meth,
+                            bucket=ratelimiter.bucket, status=resp.status)
 
         if resp.status == 429:
-            print('429!!!!!!!!!!!!!')
-            if ratelimiter.current_burst_task is not None:
-                ratelimiter.current_burst_task.cancel()
-
             data = await resp.text()
             r = RatelimitedResponse.unmarshal(data)
+            retry_after = r.retry_after / 1000
+
+            if metrics is not None:
+                metrics.inc('rest_ratelimited_total', bucket=ratelimiter.bucket,
+                            scope='global' if r.global_ratelimit else 'bucket')
+
+            if not request.replayable or \
+                    not policy.should_retry_ratelimit(request.ratelimit_attempt):
+                raise HTTPError(meth, resp.url, resp.status, r.message)
+
+            if r.global_ratelimit:
+                self.global_ratelimiter.lock(retry_after)
+            else:
+                if ratelimiter.current_burst_task is not None:
+                    ratelimiter.current_burst_task.cancel()
+                    ratelimiter.current_burst_task = None
+
+                ratelimiter.remaining = 0
+                ratelimiter._reset = datetime.now().timestamp() + retry_after
+
+            if not self._within_deadline(deadline, retry_after):
+                raise RequestDeadlineExceeded(deadline)
+
+            self._retry(request, request.ratelimit_attempt, retry_after, status=resp.status)
+
+            request.ratelimit_attempt += 1
+            return await self._enqueue(request)
 
-            ratelimiter.remaining = 0
-            ratelimiter._reset = \
-                datetime.now().timestamp() + (r.retry_after / 1000)
+        if request.replayable and \
+                policy.should_retry_status(meth, resp.status, request.attempt):
+            delay = policy.backoff(request.attempt)
 
-            return await ratelimiter.request(req)
+            if self._within_deadline(deadline, delay) and policy.budget.withdraw():
+                resp.release()
+
+                self._retry(request, request.attempt, delay, status=resp.status)
+                await asyncio.sleep(delay)
+
+                request.attempt += 1
+                return await self._enqueue(request)
+
+        if resp.status >= 500:
+            data = await resp.text()
+            raise HTTPError(meth, resp.url, resp.status, data)
 
         limit = resp.headers.get('X-Ratelimit-Limit')
         remaining = resp.headers.get('X-Ratelimit-Remaining')
@@ -145,11 +637,30 @@ class RestSession:
         if reset is not None:
             ratelimiter._reset = float(reset)
 
-        return await resp.json()
+        if profiler is None:
+            return await resp.json()
 
-    def request(self, meth, url, path_params, **kwargs):
+        decode_start = time.perf_counter_ns()
+        data = await resp.json()
+        profiler.record('rest.decode', decode_start, bucket=ratelimiter.bucket)
+        return data
+
+    def request(
+        self,
+        meth,
+        url,
+        path_params,
+        *,
+        form=None,
+        deadline=None,
+        priority=RequestPriority.NORMAL,
+        **kwargs
+    ):
         url = self.URL + url.format(**path_params)
 
+        if deadline is not None:
+            deadline = self.loop.time() + deadline
+
         bucket = '{0}-{1}-{2}-{3}'.format(
                     meth,
                     path_params.get("guild_id"),
@@ -166,19 +677,15 @@ class RestSession:
         ratelimiter = self.ratelimiters.get(bucket)
 
         if ratelimiter is None:
-            ratelimiter = Ratelimiter(self)
+            ratelimiter = Ratelimiter(self, bucket=bucket)
             self.ratelimiters[bucket] = ratelimiter
 
-        req = functools.partial(
-            self.client_session.request,
-            meth,
-            url,
-            headers=headers,
-            **kwargs
+        request = RestRequest(
+            self, ratelimiter, meth, url, dict(kwargs, headers=headers),
+            form=form, deadline=deadline, priority=priority
         )
-        actual_req = functools.partial(self._request, ratelimiter, req)
 
-        return ratelimiter.request(actual_req)
+        return self._enqueue(request)
 
     def get_guild_audit_log(
         self,
@@ -308,7 +815,10 @@ class RestSession:
         content=undefined,
         nonce=undefined,
         tts=False,
-        embed=undefined
+        embed=undefined,
+        files=undefined,
+        deadline=None,
+        priority=RequestPriority.NORMAL
     ):
         payload = {}
 
@@ -323,11 +833,18 @@ class RestSession:
         if embed is not undefined:
             payload['embed'] = embed
 
+        if files is not undefined and files:
+            kwargs = {'form': MultipartForm(payload, files)}
+        else:
+            kwargs = {'json': payload}
+
         fut = self.request(
             'POST',
             'channels/{channel_id}/messages',
             dict(channel_id=channel_id),
-            json=payload
+            deadline=deadline,
+            priority=priority,
+            **kwargs
         )
         return fut
 
@@ -1529,17 +2046,11 @@ class RestSession:
 
     def get_gateway_bot(self):
         url = self.URL + 'gateway/bot'
-        ratelimiter = Ratelimiter(self)
+        ratelimiter = Ratelimiter(self, bucket='GET-gateway-bot')
 
         base_headers = {
             'Authorization': 'Bot {}'.format(self.client.token)
         }
 
-        req = functools.partial(
-            self.client_session.request,
-            'GET',
-            url,
-            headers=base_headers
-        )
-        actual_req = functools.partial(self._request, ratelimiter, req)
-        return ratelimiter.request(actual_req)
+        request = RestRequest(self, ratelimiter, 'GET', url, dict(headers=base_headers))
+        return self._enqueue(request)
@@ -0,0 +1,5 @@
+from . import payloads # noqa
+from . import streams # noqa
+from .gateway import FakeGateway # noqa
+from .rest import FakeRestServer # noqa
+from .replay import CaptureReplay # noqa
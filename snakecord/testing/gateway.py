@@ -0,0 +1,342 @@
+import asyncio
+import base64
+import collections
+import hashlib
+import json
+import os
+
+from . import payloads
+from ..connection import (ShardOpcode, WebsocketFrame, WebsocketOpcode,
+                          WebsocketProtocol)
+
+WEBSOCKET_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+class FakeGatewaySession:
+    def __init__(self, gateway, shard, history):
+        self.gateway = gateway
+        self.id = base64.b16encode(os.urandom(16)).decode().lower()
+        self.shard = shard
+        self.sequence = 0
+        self.history = collections.deque(maxlen=history)
+        self.protocol = None
+        self.stream_task = None
+
+    @property
+    def shard_id(self):
+        return self.shard[0] if self.shard is not None else 0
+
+    def dispatch(self, name, data):
+        self.sequence += 1
+        payload = {'op': ShardOpcode.DISPATCH, 's': self.sequence, 't': name, 'd': data}
+        self.history.append(payload)
+
+        if self.protocol is not None:
+            self.protocol.send_json(payload)
+
+    def replay(self, sequence):
+        for payload in self.history:
+            if payload['s'] > sequence:
+                self.protocol.send_json(payload)
+
+    def stop(self):
+        if self.stream_task is not None:
+            self.stream_task.cancel()
+            self.stream_task = None
+
+
+class FakeGatewayProtocol(WebsocketProtocol):
+    def __init__(self, gateway):
+        super().__init__(None)
+        self.gateway = gateway
+        self.transport = None
+        self.session = None
+        self.bytes_sent = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self.gateway._disconnected(self)
+
+    def handshake(self):
+        headers = {}
+        for line in self.headers.split(b'\r\n')[1:]:
+            if b':' in line:
+                name, value = line.split(b':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        key = headers.get(b'sec-websocket-key', b'')
+        accept = base64.b64encode(hashlib.sha1(key + WEBSOCKET_GUID).digest())
+
+        self.transport.write(
+            b'HTTP/1.1 101 Switching Protocols\r\n'
+            b'Upgrade: websocket\r\n'
+            b'Connection: Upgrade\r\n'
+            b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n'
+        )
+        self.gateway._connected(self)
+
+    def data_received(self, data):
+        handshaking = not self.have_headers.is_set()
+
+        super().data_received(data)
+
+        if handshaking and self.have_headers.is_set():
+            self.handshake()
+
+    def frame_received(self, frame):
+        opcode = WebsocketFrame.get_opcode(frame.fbyte)
+
+        if opcode == WebsocketOpcode.TEXT:
+            self.gateway.handle(self, json.loads(frame.data))
+        elif opcode == WebsocketOpcode.PING:
+            self.send(frame.data, opcode=WebsocketOpcode.PONG)
+        elif opcode == WebsocketOpcode.CLOSE:
+            self.transport.close()
+
+    def send(self, data, *, opcode=WebsocketOpcode.TEXT):
+        if self.transport is None or self.transport.is_closing():
+            return
+
+        frame = WebsocketFrame.create_frame(data, opcode=opcode, masked=False)
+        self.bytes_sent += len(frame)
+        self.transport.write(frame)
+
+    def send_json(self, data):
+        self.send(json.dumps(data).encode())
+
+    def close(self, code=1000):
+        self.send(code.to_bytes(2, 'big'), opcode=WebsocketOpcode.CLOSE)
+        self.transport.close()
+
+
+class FakeGateway:
+    def __init__(
+        self,
+        *,
+        host='127.0.0.1',
+        port=0,
+        shards=1,
+        max_concurrency=1,
+        heartbeat_interval=41250,
+        stream=None,
+        rate=None,
+        history=10000,
+        members=None,
+        chunk_size=1000,
+        loop=None
+    ):
+        self.loop = loop or asyncio.get_event_loop()
+        self.host = host
+        self.port = port
+        self.shards = shards
+        self.max_concurrency = max_concurrency
+        self.heartbeat_interval = heartbeat_interval
+        self.stream = stream
+        self.rate = rate
+        self.history = history
+        # guild id -> member payloads served for REQUEST_GUILD_MEMBERS
+        self.members = members if members is not None else {}
+        self.chunk_size = chunk_size
+
+        self.server = None
+        self.protocols = set()
+        self.sessions = {}
+
+        self.identifies = 0
+        self.resumes = 0
+        self.heartbeats = 0
+        self.events_sent = 0
+        self.member_requests = 0
+
+    @property
+    def url(self):
+        return 'ws://{0.host}:{0.port}/?v=7&encoding=json'.format(self)
+
+    @property
+    def gateway_data(self):
+        return {
+            'url': self.url,
+            'shards': self.shards,
+            'session_start_limit': {
+                'total': 1000,
+                'remaining': 1000,
+                'reset_after': 0,
+                'max_concurrency': self.max_concurrency
+            }
+        }
+
+    @property
+    def bytes_sent(self):
+        return sum(protocol.bytes_sent for protocol in self.protocols)
+
+    async def start(self):
+        self.server = await self.loop.create_server(
+            lambda: FakeGatewayProtocol(self), self.host, self.port
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        for session in self.sessions.values():
+            session.stop()
+
+        for protocol in list(self.protocols):
+            protocol.transport.close()
+
+        self.server.close()
+        await self.server.wait_closed()
+
+    def _connected(self, protocol):
+        self.protocols.add(protocol)
+        protocol.send_json({
+            'op': ShardOpcode.HELLO,
+            'd': {'heartbeat_interval': self.heartbeat_interval}
+        })
+
+    def _disconnected(self, protocol):
+        self.protocols.discard(protocol)
+
+        session = protocol.session
+        if session is not None and session.protocol is protocol:
+            # Keep the session around so it can be resumed, only stop
+            # feeding it events nobody will read.
+            session.protocol = None
+            session.stop()
+
+    def handle(self, protocol, payload):
+        opcode = payload['op']
+        data = payload.get('d')
+
+        if opcode == ShardOpcode.HEARTBEAT:
+            self.heartbeats += 1
+            protocol.send_json({'op': ShardOpcode.HEARTBEAT_ACK})
+        elif opcode == ShardOpcode.IDENTIFY:
+            self.identify(protocol, data)
+        elif opcode == ShardOpcode.RESUME:
+            self.resume(protocol, data)
+        elif opcode == ShardOpcode.REQUEST_GUILD_MEMBERS:
+            self.request_guild_members(protocol, data)
+
+    def identify(self, protocol, data):
+        self.identifies += 1
+
+        session = FakeGatewaySession(self, data.get('shard'), self.history)
+        session.protocol = protocol
+        protocol.session = session
+        self.sessions[session.id] = session
+
+        session.dispatch('READY', payloads.ready(session_id=session.id, shard=session.shard))
+        self.start_stream(session)
+
+    def resume(self, protocol, data):
+        session = self.sessions.get(data.get('session_id'))
+
+        if session is None:
+            protocol.send_json({'op': ShardOpcode.INVALID_SESSION, 'd': False})
+            return
+
+        self.resumes += 1
+
+        session.protocol = protocol
+        protocol.session = session
+        session.replay(data.get('seq') or 0)
+        session.dispatch('RESUMED', {})
+        self.start_stream(session)
+
+    def request_guild_members(self, protocol, data):
+        self.member_requests += 1
+
+        session = protocol.session
+        guild_id = data['guild_id']
+        members = self.members.get(guild_id, ())
+
+        user_ids = data.get('user_ids')
+        not_found = []
+        if user_ids is not None:
+            by_id = {member['user']['id']: member for member in members}
+            members = [by_id[user_id] for user_id in user_ids if user_id in by_id]
+            not_found = [user_id for user_id in user_ids if user_id not in by_id]
+        else:
+            query = data.get('query', '').lower()
+            if query:
+                members = [
+                    member for member in members
+                    if member['user']['username'].lower().startswith(query)
+                ]
+
+            if data.get('limit'):
+                members = members[:data['limit']]
+
+        chunks = [
+            members[i:i + self.chunk_size]
+            for i in range(0, len(members), self.chunk_size)
+        ] or [[]]
+
+        for index, chunk in enumerate(chunks):
+            payload = {
+                'guild_id': guild_id,
+                'members': chunk,
+                'chunk_index': index,
+                'chunk_count': len(chunks)
+            }
+
+            if index == 0 and not_found:
+                payload['not_found'] = not_found
+
+            if data.get('presences'):
+                payload['presences'] = [
+                    {'user': {'id': member['user']['id']}, 'status': 'online',
+                     'activities': [], 'client_status': {'desktop': 'online'}}
+                    for member in chunk
+                ]
+
+            if data.get('nonce') is not None:
+                payload['nonce'] = data['nonce']
+
+            session.dispatch('GUILD_MEMBERS_CHUNK', payload)
+            self.events_sent += 1
+
+    def start_stream(self, session):
+        if self.stream is not None and session.stream_task is None:
+            session.stream_task = self.loop.create_task(self._run_stream(session))
+
+    async def _iter_stream(self, session):
+        stream = self.stream(session.shard_id, self.shards)
+
+        if hasattr(stream, '__aiter__'):
+            async for item in stream:
+                yield item
+        else:
+            for item in stream:
+                yield item
+
+    async def _run_stream(self, session):
+        start = self.loop.time()
+        sent = 0
+
+        async for item in self._iter_stream(session):
+            name, data = item[0], item[1]
+
+            if len(item) > 2 and item[2]:
+                await asyncio.sleep(item[2])
+            elif self.rate is not None:
+                # Only sleep once we are ahead of schedule, so high rates are
+                # sent in bursts instead of being capped by the timer.
+                delay = start + sent / self.rate - self.loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif sent % 100 == 0:
+                await asyncio.sleep(0)
+
+            session.dispatch(name, data)
+            self.events_sent += 1
+            sent += 1
+
+        session.stream_task = None
+
+    def dispatch(self, name, data, *, shard_id=None):
+        for session in self.sessions.values():
+            if shard_id is None or session.shard_id == shard_id:
+                session.dispatch(name, data)
+                self.events_sent += 1
@@ -0,0 +1,154 @@
+import itertools
+import time
+
+from ..enums import ChannelType
+from ..utils import DISCORD_EPOCH
+
+_increment = itertools.count()
+
+
+def snowflake():
+    timestamp = int(time.time() * 1000) - DISCORD_EPOCH
+    return str((timestamp << 22) | (next(_increment) & 0x3FFFFF))
+
+
+def user(*, user_id=None, bot=False):
+    user_id = user_id or snowflake()
+    return {
+        'id': user_id,
+        'username': 'user-%s' % user_id[-6:],
+        'discriminator': '0001',
+        'avatar': None,
+        'bot': bot,
+        'public_flags': 0
+    }
+
+
+def member(*, user_id=None, roles=()):
+    return {
+        'user': user(user_id=user_id),
+        'nick': None,
+        'roles': list(roles),
+        'joined_at': '2021-01-01T00:00:00.000000+00:00',
+        'premium_since': None,
+        'deaf': False,
+        'mute': False
+    }
+
+
+def role(*, role_id=None, name='role', position=0):
+    return {
+        'id': role_id or snowflake(),
+        'name': name,
+        'color': 0,
+        'hoist': False,
+        'position': position,
+        'permissions': '104324673',
+        'managed': False,
+        'mentionable': False
+    }
+
+
+def channel(*, channel_id=None, guild_id=None, name='general', position=0,
+            channel_type=ChannelType.GUILD_TEXT):
+    return {
+        'id': channel_id or snowflake(),
+        'guild_id': guild_id,
+        'type': int(channel_type),
+        'name': name,
+        'position': position,
+        'permission_overwrites': [],
+        'nsfw': False,
+        'parent_id': None,
+        'topic': None,
+        'last_message_id': None,
+        'rate_limit_per_user': 0
+    }
+
+
+def guild(*, guild_id=None, members=10, channels=5, roles=3):
+    guild_id = guild_id or snowflake()
+    return {
+        'id': guild_id,
+        'name': 'guild-%s' % guild_id[-6:],
+        'icon': None,
+        'splash': None,
+        'discovery_splash': None,
+        'owner_id': snowflake(),
+        'region': 'us-east',
+        'afk_channel_id': None,
+        'afk_timeout': 300,
+        'verification_level': 0,
+        'default_message_notifications': 0,
+        'explicit_content_filter': 0,
+        'roles': [role(role_id=guild_id, name='@everyone')] + [
+            role(name='role-%s' % i, position=i + 1) for i in range(roles)
+        ],
+        'emojis': [],
+        'features': [],
+        'mfa_level': 0,
+        'application_id': None,
+        'system_channel_id': None,
+        'system_channel_flags': 0,
+        'rules_channel_id': None,
+        'joined_at': '2021-01-01T00:00:00.000000+00:00',
+        'large': members > 250,
+        'unavailable': False,
+        'member_count': members,
+        'voice_states': [],
+        'members': [member() for _ in range(members)],
+        'channels': [
+            channel(guild_id=guild_id, name='channel-%s' % i, position=i)
+            for i in range(channels)
+        ],
+        'presences': [],
+        'premium_tier': 0,
+        'preferred_locale': 'en-US'
+    }
+
+
+def message(*, channel_id, guild_id=None, author=None, content='Hello, world!'):
+    author = author or user()
+    payload = {
+        'id': snowflake(),
+        'channel_id': channel_id,
+        'author': author,
+        'content': content,
+        'timestamp': '2021-01-01T00:00:00.000000+00:00',
+        'edited_timestamp': None,
+        'tts': False,
+        'mention_everyone': False,
+        'mentions': [],
+        'mention_roles': [],
+        'attachments': [],
+        'embeds': [],
+        'pinned': False,
+        'type': 0,
+        'flags': 0
+    }
+
+    if guild_id is not None:
+        payload['guild_id'] = guild_id
+        payload['member'] = {
+            'roles': [],
+            'joined_at': '2021-01-01T00:00:00.000000+00:00',
+            'deaf': False,
+            'mute': False
+        }
+
+    return payload
+
+
+def ready(*, session_id, shard=None, guilds=()):
+    payload = {
+        'v': 7,
+        'user': user(bot=True),
+        'private_channels': [],
+        'guilds': [{'id': guild_id, 'unavailable': True} for guild_id in guilds],
+        'session_id': session_id
+    }
+
+    if shard is not None:
+        payload['shard'] = shard
+
+    return payload
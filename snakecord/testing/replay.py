@@ -0,0 +1,145 @@
+import asyncio
+import time
+
+from ..capture import read_capture
+from ..client import Client
+from ..connection import Shard, WebsocketFrame, WebsocketProtocol
+
+READ_SIZE = 64 * 1024
+
+
+class ReplayShard(Shard):
+    # A shard with nothing on the other end, whatever it sends is dropped
+    # and the reconnects a capture asks for are ignored.
+    def send(self, data, *args, **kwargs):
+        self.bytes_sent += len(data)
+
+    async def reconnect(self, *, resume=True, delay=0):
+        pass
+
+    def close(self, code=1000):
+        self.closing = True
+        self.heartbeat_handler.stop()
+
+
+def encode(record):
+    fbyte = record.fbyte
+    return bytes(WebsocketFrame.create_frame(
+        record.data,
+        opcode=WebsocketFrame.get_opcode(fbyte),
+        fin=bool(WebsocketFrame.get_fin(fbyte)),
+        rsv1=bool(WebsocketFrame.get_rsv1(fbyte)),
+        rsv2=bool(WebsocketFrame.get_rsv2(fbyte)),
+        rsv3=bool(WebsocketFrame.get_rsv3(fbyte)),
+        masked=False
+    ))
+
+
+class CaptureReplay:
+    # Feeds a GatewayCapture back through WebsocketProtocol.data_received,
+    # either keeping the recorded spacing between frames (scaled by `speed`)
+    # or with speed=None as fast as possible in `read_size` reads.
+    def __init__(
+        self,
+        path,
+        *,
+        client=None,
+        speed=None,
+        shard_ids=None,
+        read_size=READ_SIZE,
+        loop=None
+    ):
+        self.loop = loop or asyncio.get_event_loop()
+        self.path = path
+        self.client = client or Client(loop=self.loop)
+        self.speed = speed
+        self.shard_ids = shard_ids
+        self.read_size = read_size
+
+        self.frames = 0
+        self.bytes = 0
+        self.seconds = None
+
+    def get_shard(self, shard_id):
+        sharder = self.client.sharder
+        shard = sharder.shards.get(shard_id)
+
+        if shard is None:
+            shard = ReplayShard('ws://127.0.0.1/', sharder, shard_id)
+            shard.protocol = WebsocketProtocol(shard)
+            shard.protocol.have_headers.set()
+            sharder.shards[shard_id] = shard
+
+        return shard
+
+    def records(self):
+        for record in read_capture(self.path):
+            if self.shard_ids is None or record.shard_id in self.shard_ids:
+                yield record
+
+    async def _run_timed(self):
+        start = self.loop.time()
+        first = None
+
+        for record in self.records():
+            if first is None:
+                first = record.timestamp
+
+            delay = start + (record.timestamp - first) / self.speed - self.loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            frame = encode(record)
+            self.get_shard(record.shard_id).protocol.data_received(frame)
+
+            self.frames += 1
+            self.bytes += len(frame)
+
+    async def _run_fast(self):
+        buffers = {}
+
+        def feed(shard_id):
+            data = bytes(buffers.pop(shard_id))
+            self.get_shard(shard_id).protocol.data_received(data)
+            self.bytes += len(data)
+
+        for record in self.records():
+            buffer = buffers.get(record.shard_id)
+            if buffer is None:
+                buffer = bytearray()
+                buffers[record.shard_id] = buffer
+
+            buffer += encode(record)
+            self.frames += 1
+
+            if len(buffer) >= self.read_size:
+                feed(record.shard_id)
+                # Let the tasks listeners started run, like they would
+                # between socket reads.
+                await asyncio.sleep(0)
+
+        for shard_id in list(buffers):
+            feed(shard_id)
+
+        await asyncio.sleep(0)
+
+    async def run(self):
+        start = time.perf_counter()
+
+        if self.speed is None:
+            await self._run_fast()
+        else:
+            await self._run_timed()
+
+        self.seconds = time.perf_counter() - start
+        return self
+
+    async def close(self):
+        for shard in self.client.sharder.shards.values():
+            shard.close()
+
+        await self.client.rest.client_session.close()
+
+    def __repr__(self):
+        return '<CaptureReplay path={0.path!r} frames={0.frames} ' \
+               'bytes={0.bytes} seconds={0.seconds}>'.format(self)
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import re
+import time
+
+from aiohttp import web
+
+from . import payloads
+
+MAJOR_PARAMETERS = ('channels', 'guilds', 'webhooks')
+
+
+class FakeBucket:
+    def __init__(self, name, limit, per):
+        self.name = name
+        self.limit = limit
+        self.per = per
+        self.remaining = limit
+        self.reset = 0.0
+
+    def consume(self, now):
+        if now >= self.reset:
+            self.remaining = self.limit
+            self.reset = now + self.per
+
+        if self.remaining <= 0:
+            return False
+
+        self.remaining -= 1
+        return True
+
+    def headers(self, now):
+        return {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(self.remaining),
+            'X-RateLimit-Reset': '%.3f' % self.reset,
+            'X-RateLimit-Reset-After': '%.3f' % max(self.reset - now, 0),
+            'X-RateLimit-Bucket': self.name
+        }
+
+
+class FakeRestServer:
+    def __init__(
+        self,
+        *,
+        host='127.0.0.1',
+        port=0,
+        gateway=None,
+        bucket_limit=5,
+        bucket_per=5.0,
+        global_limit=50,
+        global_per=1.0,
+        latency=0.0,
+        loop=None
+    ):
+        self.loop = loop or asyncio.get_event_loop()
+        self.host = host
+        self.port = port
+        self.gateway = gateway
+        self.bucket_limit = bucket_limit
+        self.bucket_per = bucket_per
+        self.latency = latency
+
+        self.buckets = {}
+        self.global_bucket = FakeBucket('global', global_limit, global_per)
+        self.routes = []
+
+        self.requests = 0
+        self.ratelimited = 0
+
+        self.app = web.Application()
+        self.app.router.add_route('*', '/api/v7/{path:.*}', self._handle)
+        self.runner = None
+
+        self.route('GET', 'gateway/bot')(self._get_gateway_bot)
+        self.route('GET', 'gateway')(self._get_gateway_bot)
+        self.route('POST', 'channels/{channel_id}/messages')(self._create_message)
+
+    @property
+    def url(self):
+        return 'http://{0.host}:{0.port}/api/v7/'.format(self)
+
+    def route(self, method, path):
+        pattern = re.compile('^' + re.sub(r'{(\w+)}', r'(?P<\1>[^/]+)', path) + '$')
+
+        def wrapped(func):
+            # Routes registered later take precedence over the defaults.
+            self.routes.insert(0, (method.upper(), pattern, func))
+            return func
+
+        return wrapped
+
+    def get_bucket(self, method, path):
+        parts = path.split('/')
+
+        if parts[0] in MAJOR_PARAMETERS and len(parts) > 1:
+            key = '%s %s/%s' % (method, parts[0], parts[1])
+        else:
+            key = '%s %s' % (method, path)
+
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = FakeBucket(key, self.bucket_limit, self.bucket_per)
+            self.buckets[key] = bucket
+
+        return bucket
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        await self.runner.cleanup()
+
+    def _ratelimited(self, bucket, now, is_global):
+        self.ratelimited += 1
+
+        retry_after = max(bucket.reset - now, 0)
+        body = {
+            'message': 'You are being rate limited.',
+            'retry_after': int(retry_after * 1000),
+            'global': is_global
+        }
+
+        headers = {'Retry-After': str(int(retry_after * 1000))}
+        if is_global:
+            headers['X-RateLimit-Global'] = 'true'
+        else:
+            headers.update(bucket.headers(now))
+
+        return web.json_response(body, status=429, headers=headers)
+
+    async def _handle(self, request):
+        self.requests += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        path = request.match_info['path'].strip('/')
+        now = time.time()
+
+        if not self.global_bucket.consume(now):
+            return self._ratelimited(self.global_bucket, now, True)
+
+        bucket = self.get_bucket(request.method, path)
+        if not bucket.consume(now):
+            return self._ratelimited(bucket, now, False)
+
+        for method, pattern, func in self.routes:
+            match = pattern.match(path)
+            if match is not None and method in (request.method, '*'):
+                data = await func(request, **match.groupdict())
+                break
+        else:
+            data = {}
+
+        if isinstance(data, web.StreamResponse):
+            data.headers.update(bucket.headers(now))
+            return data
+
+        return web.json_response(data, headers=bucket.headers(now))
+
+    async def _get_gateway_bot(self, request):
+        if self.gateway is None:
+            raise web.HTTPNotFound()
+        return self.gateway.gateway_data
+
+    async def _read_payload(self, request):
+        if request.content_type != 'multipart/form-data':
+            return await request.json()
+
+        data = {}
+        reader = await request.multipart()
+
+        async for part in reader:
+            if part.name == 'payload_json':
+                data = json.loads(await part.text())
+            else:
+                # Drain uploads so the client sees a complete exchange.
+                while await part.read_chunk():
+                    pass
+
+        return data
+
+    async def _create_message(self, request, channel_id):
+        data = await self._read_payload(request)
+
+        message = payloads.message(channel_id=channel_id, content=data.get('content'))
+        message['tts'] = bool(data.get('tts'))
+        if data.get('embed'):
+            message['embeds'] = [data['embed']]
+
+        return message
@@ -0,0 +1,61 @@
+import itertools
+import json
+
+from . import payloads
+
+
+def synthetic(*, guilds=1, members=10, channels=5, messages=None):
+    # Returns a stream factory for FakeGateway, each shard gets its own
+    # guilds followed by `messages` MESSAGE_CREATEs (forever if None).
+    def stream(shard_id, shard_count):
+        created = [
+            payloads.guild(members=members, channels=channels)
+            for _ in range(guilds)
+        ]
+
+        for guild in created:
+            yield 'GUILD_CREATE', guild
+
+        targets = itertools.cycle([
+            (guild['id'], channel['id'], [member['user'] for member in guild['members']])
+            for guild in created
+            for channel in guild['channels']
+        ])
+
+        counter = itertools.count() if messages is None else range(messages)
+        for i in counter:
+            guild_id, channel_id, users = next(targets)
+            author = users[i % len(users)] if users else None
+            yield 'MESSAGE_CREATE', payloads.message(
+                channel_id=channel_id, guild_id=guild_id, author=author
+            )
+
+    return stream
+
+
+def recorded(path, *, speed=1.0):
+    # Replays a JSON lines recording of {"t": name, "d": data, "ts": seconds}
+    # keeping the original spacing between events, scaled by `speed`
+    # (None sends everything as fast as the gateway's rate allows).
+    def stream(shard_id, shard_count):
+        last = None
+
+        with open(path) as fp:
+            for line in fp:
+                if not line.strip():
+                    continue
+
+                event = json.loads(line)
+                shard = event.get('shard')
+                if shard is not None and shard != shard_id:
+                    continue
+
+                timestamp = event.get('ts')
+                delay = 0
+                if speed is not None and timestamp is not None and last is not None:
+                    delay = max(timestamp - last, 0) / speed
+                last = timestamp
+
+                yield event['t'], event['d'], delay
+
+    return stream
@@ -24,6 +24,16 @@ class UserState(BaseState):
         self._items[user.id] = user
         return user
 
+    def _patch(self, data):
+        # Gateway events often carry partial users, only the fields present
+        # are updated on a cached one.
+        user = self.get(data['id'])
+        if user is None:
+            return self._add(data)
+
+        user._patch(data)
+        return user
+
     async def fetch(self, user_id) -> User:
         rest = self.client.rest
         data = await rest.get_user(user_id)
@@ -33,6 +33,12 @@ class JsonStructure:
             if hasattr(bcls, '__json_fields__'):
                 cls.__json_fields__.update(bcls.__json_fields__)
 
+        # json key -> attribute names, lets _patch walk the payload instead
+        # of every field.
+        cls.__json_keys__ = {}
+        for name, field in cls.__json_fields__.items():
+            cls.__json_keys__.setdefault(field.name, []).append((name, field))
+
     @classmethod
     def unmarshal(cls, data, *args, init_class=True, **kwargs):
         if isinstance(data, (str, bytes, bytearray)):
@@ -56,6 +62,20 @@ class JsonStructure:
                 if set_default:
                     setattr(self, name, field.default)
 
+    def _patch(self, data):
+        # Applies a partial payload, only the keys present are touched.
+        keys = self.__json_keys__
+        for key, value in data.items():
+            fields = keys.get(key)
+            if fields is None:
+                continue
+
+            for name, field in fields:
+                try:
+                    setattr(self, name, field.unmarshal(value))
+                except Exception:
+                    continue
+
     def to_dict(self, cls=None):
         dct = {}
 
@@ -3,14 +3,16 @@ import struct
 import nacl.secret
 
 from . import structures
+from .state import BaseState
 # from .connection import VoiceUDPProtocol, VoiceWSProtocol
 # from .enums import VoiceConnectionOpcode
 
 
 class VoiceState(structures.VoiceState):
-    def __init__(self, voice_channel):
+    def __init__(self, voice_channel=None, *, guild=None):
         self.voice_channel = voice_channel
-        self.guild = voice_channel.guild
+        self.guild = voice_channel.guild if voice_channel is not None else guild
+        self.member = None
 
     def _update(self, *args, **kwargs):
         super()._update(*args, **kwargs)
@@ -18,6 +20,33 @@ class VoiceState(structures.VoiceState):
         if self._member is not None:
             self.member = self.guild.members._add(self._member)
 
+    def _patch(self, data):
+        super()._patch(data)
+
+        if 'channel_id' in data:
+            channels = self.guild._state.client.channels
+            self.voice_channel = channels.get(self.channel_id)
+
+        if 'member' in data:
+            self.member = self.guild.members._add(self._member)
+
+
+class VoiceStateState(BaseState):
+    def __init__(self, client, guild):
+        super().__init__(client)
+        self.guild = guild
+
+    def _add(self, data):
+        voice_state = self.get(data['user_id'])
+        if voice_state is not None:
+            voice_state._patch(data)
+            return voice_state
+
+        voice_state = VoiceState.unmarshal(data, guild=self.guild)
+        voice_state.voice_channel = self.client.channels.get(voice_state.channel_id)
+        self._items[voice_state.user_id] = voice_state
+        return voice_state
+
 
 class VoiceConnection:
     def __init__(self, voice_state, voice_server_update):